@@ -0,0 +1,234 @@
+"""Build the handout and the presentation, concurrently and incrementally.
+
+Each build runs in its own process, with Sphinx reading and writing
+documents in parallel ("-j auto").  Doctrees are kept between builds
+as usual; in addition, a manifest of source file content hashes is
+kept alongside them, and files whose content hasn't changed get their
+previous modification time back before Sphinx looks at them.  A git
+checkout or a touch no longer causes those documents to be rebuilt.
+
+The time taken to read each document is reported, slowest first::
+
+    python build_docs.py                  # both
+    python build_docs.py handout --jobs 2
+
+Out of date PNGs are rendered from presentation/_svgs/ first, unless
+Inkscape isn't installed; see rasterize.py.  The handout and
+presentation Makefiles work as before.
+
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import sys
+import time
+
+import rasterize
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+# source directory, build directory, builder; the same as the Makefiles
+BUILDS = {
+    "handout": ("handout/source", "handout/_build", "html"),
+    "presentation": ("presentation", "presentation/_build", "slides"),
+}
+
+MANIFEST = "content_hashes.json"
+
+
+def _source_files(srcdir):
+    for dirpath, dirnames, filenames in os.walk(srcdir):
+        dirnames[:] = [
+            name
+            for name in dirnames
+            if not name.startswith((".", "_build"))
+        ]
+        for filename in filenames:
+            yield os.path.join(dirpath, filename)
+
+
+def _sha1(path):
+    with open(path, "rb") as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def restore_mtimes(srcdir, doctreedir):
+    """Give unchanged files back the mtime they had at the last build.
+
+    Returns the number of files whose mtime was restored.
+
+    """
+    try:
+        with open(os.path.join(doctreedir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return 0
+
+    restored = 0
+    for path in _source_files(srcdir):
+        entry = manifest.get(os.path.relpath(path, srcdir))
+        if entry is None:
+            continue
+        digest, mtime_ns = entry
+        if os.stat(path).st_mtime_ns != mtime_ns and _sha1(path) == digest:
+            os.utime(path, ns=(mtime_ns, mtime_ns))
+            restored += 1
+    return restored
+
+
+def save_manifest(srcdir, doctreedir):
+    manifest = {
+        os.path.relpath(path, srcdir): [
+            _sha1(path),
+            os.stat(path).st_mtime_ns,
+        ]
+        for path in _source_files(srcdir)
+    }
+    os.makedirs(doctreedir, exist_ok=True)
+    with open(os.path.join(doctreedir, MANIFEST), "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+
+
+# per-document read times are kept on the build environment, so that
+# they're merged back from Sphinx's parallel reader processes
+
+
+def _read_times(env):
+    if not hasattr(env, "doc_read_times"):
+        env.doc_read_times = {}
+    return env.doc_read_times
+
+
+def _source_read(app, docname, source):
+    app.env.temp_data["read_started"] = time.perf_counter()
+
+
+def _doctree_read(app, doctree):
+    started = app.env.temp_data.get("read_started")
+    if started is not None:
+        _read_times(app.env)[app.env.docname] = time.perf_counter() - started
+
+
+def _env_purge_doc(app, env, docname):
+    _read_times(env).pop(docname, None)
+
+
+def _env_merge_info(app, env, docnames, other):
+    _read_times(env).update(
+        (docname, seconds)
+        for docname, seconds in _read_times(other).items()
+        if docname in docnames
+    )
+
+
+def build(name, jobs):
+    """Run one build; returns its status code, elapsed time, number of
+    files whose mtime was restored, and (docname, seconds) for each
+    document read."""
+    from sphinx.application import Sphinx
+    from sphinx.util.docutils import docutils_namespace, patch_docutils
+
+    source, build_dir, builder = BUILDS[name]
+    srcdir = os.path.join(HERE, source)
+    outdir = os.path.join(HERE, build_dir, builder)
+    doctreedir = os.path.join(HERE, build_dir, "doctrees")
+
+    now = time.perf_counter()
+    restored = restore_mtimes(srcdir, doctreedir)
+
+    read = []
+    with patch_docutils(srcdir), docutils_namespace():
+        app = Sphinx(
+            srcdir,
+            srcdir,
+            outdir,
+            doctreedir,
+            builder,
+            status=None,
+            warning=sys.stderr,
+            parallel=jobs,
+        )
+        app.connect(
+            "env-before-read-docs",
+            lambda app, env, docnames: read.extend(docnames),
+        )
+        app.connect("source-read", _source_read)
+        app.connect("doctree-read", _doctree_read)
+        app.connect("env-purge-doc", _env_purge_doc)
+        app.connect("env-merge-info", _env_merge_info)
+        app.build()
+
+    save_manifest(srcdir, doctreedir)
+    times = _read_times(app.env)
+    return (
+        app.statuscode,
+        time.perf_counter() - now,
+        restored,
+        sorted(
+            ((docname, times.get(docname, 0)) for docname in read),
+            key=lambda item: item[1],
+            reverse=True,
+        ),
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "builds",
+        nargs="*",
+        metavar="BUILD",
+        help="%s; default all" % ", ".join(sorted(BUILDS)),
+    )
+    parser.add_argument(
+        "-j",
+        "--jobs",
+        default="auto",
+        help="parallel jobs per build, or 'auto' for one per CPU",
+    )
+    parser.add_argument(
+        "--no-images",
+        action="store_true",
+        help="don't render out of date PNGs from presentation/_svgs",
+    )
+    options = parser.parse_args(argv)
+    builds = options.builds or sorted(BUILDS)
+    for name in builds:
+        if name not in BUILDS:
+            parser.error("unknown build %r" % name)
+    if options.jobs == "auto":
+        jobs = os.cpu_count() or 1
+    else:
+        jobs = int(options.jobs)
+
+    if not options.no_images:
+        try:
+            rendered, unchanged = rasterize.rasterize(max_workers=jobs)
+        except rasterize.InkscapeNotFound as err:
+            print(f"images: skipped, {err}", file=sys.stderr)
+        else:
+            print(
+                f"images: {len(rendered)} rendered, "
+                f"{len(unchanged)} unchanged"
+            )
+
+    status = 0
+    with ProcessPoolExecutor(max_workers=len(builds)) as pool:
+        futures = {name: pool.submit(build, name, jobs) for name in builds}
+        for name, future in futures.items():
+            statuscode, elapsed, restored, documents = future.result()
+            status = status or statuscode
+            print(
+                f"{name}: {elapsed:.2f} sec, {len(documents)} documents "
+                f"read, {restored} unchanged files kept"
+            )
+            for docname, seconds in documents:
+                print(f"    {seconds:8.3f} sec  {docname}")
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,144 @@
+/*
+ * Glossary search box.  The index, written by the glossary_index
+ * extension, is fetched the first time the box gets focus; lookups are
+ * binary searches for the typed prefix over its sorted term and word
+ * arrays.
+ */
+(function () {
+  "use strict";
+
+  var MAX_RESULTS = 12;
+
+  // the index is next to this script; page URLs in it are relative to
+  // the directory above
+  var scriptSrc = document.currentScript.src;
+  var staticRoot = scriptSrc.substring(0, scriptSrc.lastIndexOf("/") + 1);
+  var root = staticRoot.replace(/_static\/$/, "");
+
+  var index = null;
+  var loading = null;
+
+  function load() {
+    if (loading === null) {
+      loading = fetch(staticRoot + "glossary-index.json")
+        .then(function (response) {
+          return response.json();
+        })
+        .then(function (data) {
+          index = data;
+          return data;
+        });
+    }
+    return loading;
+  }
+
+  // first position in sorted [key, value] pairs whose key is >= prefix
+  function lowerBound(pairs, prefix) {
+    var low = 0;
+    var high = pairs.length;
+    while (low < high) {
+      var mid = (low + high) >>> 1;
+      if (pairs[mid][0] < prefix) {
+        low = mid + 1;
+      } else {
+        high = mid;
+      }
+    }
+    return low;
+  }
+
+  function withPrefix(pairs, prefix) {
+    var found = [];
+    for (
+      var i = lowerBound(pairs, prefix);
+      i < pairs.length && pairs[i][0].lastIndexOf(prefix, 0) === 0;
+      i++
+    ) {
+      found.push(pairs[i][1]);
+    }
+    return found;
+  }
+
+  // entries whose terms start with the whole query come first, then
+  // those whose definitions have words starting with every query word
+  function search(query) {
+    query = query.toLowerCase().trim();
+    if (!query) {
+      return [];
+    }
+    var results = [];
+    var seen = {};
+    function add(entry) {
+      if (!seen[entry]) {
+        seen[entry] = true;
+        results.push(entry);
+      }
+    }
+
+    withPrefix(index.terms, query).forEach(add);
+
+    var matching = null;
+    query.split(/\s+/).forEach(function (word) {
+      var entries = {};
+      withPrefix(index.words, word).forEach(function (nums) {
+        nums.forEach(function (num) {
+          entries[num] = true;
+        });
+      });
+      if (matching === null) {
+        matching = entries;
+      } else {
+        Object.keys(matching).forEach(function (num) {
+          if (!entries[num]) {
+            delete matching[num];
+          }
+        });
+      }
+    });
+    Object.keys(matching).forEach(function (num) {
+      add(Number(num));
+    });
+
+    return results.slice(0, MAX_RESULTS);
+  }
+
+  function render(list, entries) {
+    list.innerHTML = "";
+    entries.forEach(function (num) {
+      var entry = index.entries[num];
+      var item = document.createElement("li");
+      var link = document.createElement("a");
+      link.href = root + entry[0];
+      link.textContent = entry[1].join(", ");
+      item.appendChild(link);
+      item.appendChild(document.createTextNode(" - " + entry[2]));
+      list.appendChild(item);
+    });
+  }
+
+  document.addEventListener("DOMContentLoaded", function () {
+    var content = document.querySelector(
+      "div.body, div.content, [role=main]"
+    );
+    if (!content) {
+      return;
+    }
+
+    var box = document.createElement("div");
+    box.className = "glossary-search";
+    var input = document.createElement("input");
+    input.type = "search";
+    input.placeholder = "Search the glossary";
+    var list = document.createElement("ul");
+    box.appendChild(input);
+    box.appendChild(list);
+    content.insertBefore(box, content.firstChild);
+
+    input.addEventListener("focus", load);
+    input.addEventListener("input", function () {
+      load().then(function () {
+        render(list, search(input.value));
+      });
+    });
+  });
+})();
@@ -16,7 +16,7 @@ import sys, os
 # If extensions (or modules to document with autodoc) are in another directory,
 # add these directories to sys.path here. If the directory is relative to the
 # documentation root, use os.path.abspath to make it absolute, like shown here.
-#sys.path.insert(0, os.path.abspath('.'))
+sys.path.insert(0, os.path.abspath('.'))
 
 # -- General configuration -----------------------------------------------------
 
@@ -25,7 +25,14 @@ import sys, os
 
 # Add any Sphinx extension module names here, as strings. They can be extensions
 # coming with Sphinx (named 'sphinx.ext.*') or your custom ones.
-extensions = ['sphinx.ext.autodoc', 'sphinx.ext.intersphinx']
+extensions = ['sphinx.ext.autodoc', 'sphinx.ext.intersphinx', 'sqlrun',
+              'glossary_index']
+
+# The SQL examples in relational.rst are run at build time by the sqlrun
+# extension; a statement slower than this many milliseconds logs a warning,
+# or fails the build with sqlrun_fail_over_budget = True.
+sqlrun_time_budget = 50
+sqlrun_fail_over_budget = False
 
 # Add any paths that contain templates here, relative to this directory.
 templates_path = ['_templates']
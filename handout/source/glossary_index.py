@@ -0,0 +1,133 @@
+"""Sphinx extension that writes a search index of the glossary.
+
+Every term of every ``glossary`` directive is collected with a short
+summary of its definition, into ``_static/glossary-index.json``::
+
+    {
+        "entries": [[url, [term, ...], summary], ...],
+        "terms": [[key, entry], ...],
+        "words": [[word, [entry, ...]], ...]
+    }
+
+"terms" holds each lowercased term and "words" each word of the
+definitions, both sorted, so that a prefix is found with a binary
+search.  _static/glossary-search.js adds a search box to each page,
+which only downloads the index once it's used.
+
+"""
+
+import json
+import os
+import re
+
+from docutils import nodes
+
+SUMMARY_LENGTH = 160
+MIN_WORD_LENGTH = 3
+STOPWORDS = frozenset(
+    """
+    and are but can for from has have into its not only such than that
+    the their then there these this those was were which while who will
+    with within would
+    """.split()
+)
+
+_word = re.compile(r"[a-z][a-z0-9_]+")
+
+
+def _entries(env):
+    if not hasattr(env, "glossary_entries"):
+        env.glossary_entries = {}
+    return env.glossary_entries
+
+
+def _summary(definition):
+    # the first paragraph, without the example code and "see also" parts
+    paragraph = next(definition.findall(nodes.paragraph), definition)
+    text = " ".join(paragraph.astext().split())
+    if len(text) > SUMMARY_LENGTH:
+        text = text[:SUMMARY_LENGTH].rsplit(" ", 1)[0] + "..."
+    return text
+
+
+def _doctree_read(app, doctree):
+    found = []
+    for glossary in doctree.findall(
+        lambda node: isinstance(node, nodes.definition_list)
+        and "glossary" in node["classes"]
+    ):
+        for item in glossary.children:
+            terms = [
+                term for term in item.children if isinstance(term, nodes.term)
+            ]
+            definition = next(
+                (
+                    child
+                    for child in item.children
+                    if isinstance(child, nodes.definition)
+                ),
+                None,
+            )
+            if not terms or definition is None or not terms[0]["ids"]:
+                continue
+            found.append(
+                (
+                    terms[0]["ids"][0],
+                    [term.astext() for term in terms],
+                    _summary(definition),
+                    definition.astext(),
+                )
+            )
+    if found:
+        _entries(app.env)[app.env.docname] = found
+    else:
+        _entries(app.env).pop(app.env.docname, None)
+
+
+def _env_purge_doc(app, env, docname):
+    _entries(env).pop(docname, None)
+
+
+def _env_merge_info(app, env, docnames, other):
+    _entries(env).update(
+        (docname, found)
+        for docname, found in _entries(other).items()
+        if docname in docnames
+    )
+
+
+def build_index(builder, entries_by_doc):
+    entries, terms, words = [], [], {}
+    for docname in sorted(entries_by_doc):
+        uri = builder.get_target_uri(docname)
+        for anchor, names, summary, text in entries_by_doc[docname]:
+            num = len(entries)
+            entries.append(["%s#%s" % (uri, anchor), names, summary])
+            terms.extend([name.lower(), num] for name in names)
+            for word in set(_word.findall(text.lower())):
+                if len(word) >= MIN_WORD_LENGTH and word not in STOPWORDS:
+                    words.setdefault(word, []).append(num)
+    return {
+        "entries": entries,
+        "terms": sorted(terms),
+        "words": sorted([word, nums] for word, nums in words.items()),
+    }
+
+
+def _build_finished(app, exception):
+    if exception is not None or app.builder.format != "html":
+        return
+    index = build_index(app.builder, _entries(app.env))
+    directory = os.path.join(app.outdir, "_static")
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, "glossary-index.json"), "w") as f:
+        json.dump(index, f, separators=(",", ":"))
+
+
+def setup(app):
+    app.add_js_file("glossary-search.js", defer="defer")
+    app.connect("doctree-read", _doctree_read)
+    app.connect("env-purge-doc", _env_purge_doc)
+    app.connect("env-merge-info", _env_merge_info)
+    app.connect("build-finished", _build_finished)
+    return {"parallel_read_safe": True, "parallel_write_safe": True}
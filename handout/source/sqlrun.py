@@ -0,0 +1,325 @@
+"""Sphinx extension that runs the handout's SQL examples.
+
+The ``sql-run`` directive shows its content as a SQL code block, the
+same as ``sourcecode:: sql``, then runs it twice.  The rows shown come
+from the handout's own example data, the seven employees the text talks
+about.  How long the statement took, and SQLite's EXPLAIN QUERY PLAN,
+come from a generated database of the same tables with many more rows::
+
+    .. sql-run::
+       :max-rows: 5
+       :budget: 20
+
+       SELECT count(*) FROM employee GROUP BY dep_id
+
+A statement that takes longer than its budget in milliseconds (the
+:budget: option, or the sqlrun_time_budget setting) logs a warning;
+with sqlrun_fail_over_budget set, it fails the build instead.
+
+Results are cached on the build environment, keyed on a hash of the
+statement, the dataset and the SQLite version, so they're only run
+again when one of those changes.
+
+"""
+
+import hashlib
+import os
+import random
+import sqlite3
+import time
+
+from docutils import nodes
+from docutils.parsers.rst import directives
+from sphinx.errors import ExtensionError
+from sphinx.util import logging
+from sphinx.util.docutils import SphinxDirective
+
+logger = logging.getLogger(__name__)
+
+# change DATASET_VERSION when changing how the timing dataset is generated
+DATASET_VERSION = 2
+NUM_DEPARTMENTS = 50
+NUM_EMPLOYEES = 20000
+
+# the handout's example data; "Sales" has no employees
+DEPARTMENTS = [
+    (1, "Software Artistry"),
+    (2, "Engineering"),
+    (3, "Management"),
+    (4, "Consulting"),
+    (5, "Sales"),
+]
+EMPLOYEES = [
+    (1, "wally", 1),
+    (2, "dilbert", 1),
+    (3, "jack", 2),
+    (4, "ed", 3),
+    (5, "wendy", 1),
+    (6, "dogbert", 4),
+    (7, "boss", 3),
+]
+SALES = 5
+
+
+def dataset_hash():
+    return hashlib.sha1(
+        repr(
+            (
+                DATASET_VERSION,
+                NUM_DEPARTMENTS,
+                NUM_EMPLOYEES,
+                DEPARTMENTS,
+                EMPLOYEES,
+                sqlite3.sqlite_version,
+            )
+        ).encode()
+    ).hexdigest()
+
+
+def scaled_dataset():
+    """NUM_DEPARTMENTS departments and NUM_EMPLOYEES employees, starting
+    with the example departments; "Sales" still has no employees."""
+    random.seed(DATASET_VERSION)
+    names = dict(DEPARTMENTS)
+    departments = [
+        (dep_id, names.get(dep_id, "Department %d" % dep_id))
+        for dep_id in range(1, NUM_DEPARTMENTS + 1)
+    ]
+    dep_ids = [dep_id for dep_id, _ in departments if dep_id != SALES]
+    employee_names = [name for _, name, _ in EMPLOYEES]
+    employees = [
+        (
+            emp_id,
+            "%s%d" % (random.choice(employee_names), emp_id),
+            random.choice(dep_ids),
+        )
+        for emp_id in range(1, NUM_EMPLOYEES + 1)
+    ]
+    return departments, employees
+
+
+def generate_dataset(path, departments, employees):
+    """Create the department and employee tables of the handout, with
+    the given rows."""
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    with conn:
+        conn.executescript(
+            """
+            CREATE TABLE department (
+                 dep_id INTEGER,
+                 dep_name VARCHAR(30),
+                 PRIMARY KEY (dep_id)
+            );
+            CREATE TABLE employee (
+                 emp_id INTEGER,
+                 emp_name VARCHAR(30),
+                 dep_id INTEGER,
+                 PRIMARY KEY (emp_id),
+                 FOREIGN KEY (dep_id)
+                   REFERENCES department(dep_id)
+            );
+            CREATE INDEX ix_employee_dep_id ON employee (dep_id);
+            """
+        )
+        conn.executemany(
+            "INSERT INTO department (dep_id, dep_name) VALUES (?, ?)",
+            departments,
+        )
+        conn.executemany(
+            "INSERT INTO employee (emp_id, emp_name, dep_id) "
+            "VALUES (?, ?, ?)",
+            employees,
+        )
+    conn.close()
+
+
+def _databases(doctreedir):
+    """The paths of the example and the timing databases."""
+    return (
+        os.path.join(doctreedir, "sqlrun_example.db"),
+        os.path.join(doctreedir, "sqlrun.db"),
+    )
+
+
+def _builder_inited(app):
+    example, scaled = _databases(app.doctreedir)
+    marker = scaled + ".hash"
+    digest = dataset_hash()
+    try:
+        with open(marker) as f:
+            current = (
+                f.read() == digest
+                and os.path.exists(example)
+                and os.path.exists(scaled)
+            )
+    except OSError:
+        current = False
+    if not current:
+        os.makedirs(app.doctreedir, exist_ok=True)
+        generate_dataset(example, DEPARTMENTS, EMPLOYEES)
+        generate_dataset(scaled, *scaled_dataset())
+        with open(marker, "w") as f:
+            f.write(digest)
+
+
+def _connect(path):
+    return sqlite3.connect("file:%s?mode=ro" % path, uri=True)
+
+
+def fetch(path, sql):
+    """Run a statement; returns column names and rows."""
+    conn = _connect(path)
+    try:
+        cursor = conn.execute(sql)
+        rows = cursor.fetchall()
+        return [col[0] for col in cursor.description or ()], rows
+    finally:
+        conn.close()
+
+
+def run(path, sql, repeat=3):
+    """Run a statement; returns the number of rows, the best time of
+    ``repeat`` runs in milliseconds, and the query plan as text."""
+    conn = _connect(path)
+    try:
+        best = None
+        for _ in range(repeat):
+            now = time.perf_counter()
+            rows = conn.execute(sql).fetchall()
+            elapsed = (time.perf_counter() - now) * 1000
+            best = elapsed if best is None else min(best, elapsed)
+
+        depth = {0: -1}
+        plan = []
+        for node_id, parent, _, detail in conn.execute(
+            "EXPLAIN QUERY PLAN " + sql
+        ):
+            depth[node_id] = depth.get(parent, -1) + 1
+            plan.append("  " * depth[node_id] + detail)
+    finally:
+        conn.close()
+    return len(rows), best, "\n".join(plan)
+
+
+def format_rows(columns, rows, max_rows):
+    """Lay out rows the way the handout's example result sets are."""
+    shown = [
+        ["<NULL>" if value is None else str(value) for value in row]
+        for row in rows[:max_rows]
+    ]
+    widths = [
+        max([len(name)] + [len(row[idx]) for row in shown])
+        for idx, name in enumerate(columns)
+    ]
+    lines = [
+        " | ".join(name.ljust(width) for name, width in zip(columns, widths)),
+        "-+-".join("-" * width for width in widths),
+    ]
+    lines.extend(
+        " | ".join(value.ljust(width) for value, width in zip(row, widths))
+        for row in shown
+    )
+    lines = [line.rstrip() for line in lines]
+    if len(rows) > max_rows:
+        lines.append("... %d more" % (len(rows) - max_rows))
+    return "\n".join(lines)
+
+
+def _cache(env):
+    if not hasattr(env, "sqlrun_cache"):
+        env.sqlrun_cache = {}
+    return env.sqlrun_cache
+
+
+def _env_merge_info(app, env, docnames, other):
+    _cache(env).update(_cache(other))
+
+
+class SQLRunDirective(SphinxDirective):
+    has_content = True
+    option_spec = {
+        "max-rows": directives.nonnegative_int,
+        "budget": directives.positive_int,
+    }
+
+    def run(self):
+        sql = "\n".join(self.content)
+        max_rows = self.options.get("max-rows", 10)
+        budget = self.options.get(
+            "budget", self.config.sqlrun_time_budget
+        )
+
+        key = hashlib.sha1(
+            ("%s\0%d\0%s" % (dataset_hash(), max_rows, sql)).encode()
+        ).hexdigest()
+        cache = _cache(self.env)
+        if key not in cache:
+            example, scaled = _databases(self.env.doctreedir)
+            try:
+                columns, rows = fetch(example, sql)
+                scaled_rows, elapsed, plan = run(scaled, sql)
+            except sqlite3.Error as err:
+                raise ExtensionError(
+                    "%s:%s: %s" % (self.env.docname, self.lineno, err)
+                )
+            cache[key] = (
+                format_rows(columns, rows, max_rows) if columns else None,
+                scaled_rows,
+                elapsed,
+                plan,
+            )
+        text, num_rows, elapsed, plan = cache[key]
+
+        if elapsed > budget:
+            # not kept, so that the statement is timed again next build
+            del cache[key]
+            message = "statement took %.2f ms, over its budget of %d ms" % (
+                elapsed,
+                budget,
+            )
+            if self.config.sqlrun_fail_over_budget:
+                raise ExtensionError(
+                    "%s:%s: %s" % (self.env.docname, self.lineno, message)
+                )
+            logger.warning(message, location=(self.env.docname, self.lineno))
+
+        source = nodes.literal_block(sql, sql)
+        source["language"] = "sql"
+
+        result = [source]
+        if text:
+            result.append(self._text_block(text))
+        result.append(
+            nodes.paragraph(
+                text="With %d employees: %d row%s in %.2f ms."
+                % (
+                    NUM_EMPLOYEES,
+                    num_rows,
+                    "" if num_rows == 1 else "s",
+                    elapsed,
+                )
+            )
+        )
+        if plan:
+            result.append(self._text_block("EXPLAIN QUERY PLAN\n" + plan))
+        return result
+
+    def _text_block(self, text):
+        block = nodes.literal_block(text, text)
+        block["language"] = "text"
+        return block
+
+
+def setup(app):
+    app.add_config_value("sqlrun_time_budget", 50, "env")
+    app.add_config_value("sqlrun_fail_over_budget", False, "env")
+    app.add_directive("sql-run", SQLRunDirective)
+    app.connect("builder-inited", _builder_inited)
+    app.connect("env-merge-info", _env_merge_info)
+    return {
+        "version": str(DATASET_VERSION),
+        "parallel_read_safe": True,
+        "parallel_write_safe": True,
+    }
@@ -0,0 +1,179 @@
+"""Render the diagrams in presentation/_svgs/ to the PNGs the documents use.
+
+Each SVG is rendered with Inkscape, cropped to the drawing, at the DPI
+configured for each place it's used; the presentation and the handout
+get their own copies.  Renders run in a process pool.
+
+A manifest next to the SVGs records, for each PNG, a hash of the SVG
+and DPI it was made from and a hash of the PNG itself.  A PNG is only
+rendered again when its SVG or DPI changed, or when the PNG no longer
+matches what was rendered, e.g. it was edited or replaced by hand.  A
+PNG that's there but not in the manifest, such as one committed before
+the manifest was, is taken as it is and added to the manifest::
+
+    python rasterize.py             # what's out of date
+    python rasterize.py --force     # everything
+
+Set INKSCAPE to the inkscape executable if it's not on the PATH.
+build_docs.py runs this before building, and skips it with a warning
+when Inkscape isn't installed.
+
+"""
+
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import hashlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SVG_DIR = os.path.join(HERE, "presentation", "_svgs")
+MANIFEST = os.path.join(SVG_DIR, "rasterized.json")
+
+PRESENTATION = ("presentation", 150)
+HANDOUT = (os.path.join("handout", "source"), 96)
+
+# SVG name: the (directory, dpi) of each PNG made from it
+IMAGES = {
+    "onion": [PRESENTATION],
+    "relationshiporm": [PRESENTATION],
+    "selectorm": [PRESENTATION],
+    "sqla_arch": [PRESENTATION],
+    "tablemap": [PRESENTATION],
+    "review_foreignkey": [HANDOUT],
+    "review_grouping": [HANDOUT],
+    "review_join": [HANDOUT],
+    "review_select": [HANDOUT],
+    "review_table": [HANDOUT],
+}
+
+
+class InkscapeNotFound(Exception):
+    """There are PNGs to render and no Inkscape to render them with."""
+
+
+def _inkscape():
+    return os.environ.get("INKSCAPE", "inkscape")
+
+
+def _sha1(*chunks):
+    digest = hashlib.sha1()
+    for chunk in chunks:
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _file_sha1(path):
+    try:
+        with open(path, "rb") as f:
+            return _sha1(f.read())
+    except OSError:
+        return None
+
+
+def jobs():
+    """Yield (svg path, png path, dpi, source hash) for each PNG."""
+    for name, targets in sorted(IMAGES.items()):
+        svg = os.path.join(SVG_DIR, name + ".svg")
+        with open(svg, "rb") as f:
+            data = f.read()
+        for directory, dpi in targets:
+            png = os.path.join(HERE, directory, name + ".png")
+            yield svg, png, dpi, _sha1(data, str(dpi).encode())
+
+
+def render(svg, png, dpi):
+    """Render one SVG; returns the hash of the PNG written."""
+    subprocess.run(
+        [
+            _inkscape(),
+            "--export-area-drawing",
+            "--export-type=png",
+            "--export-dpi=%d" % dpi,
+            "--export-filename=%s" % png,
+            svg,
+        ],
+        check=True,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    return _file_sha1(png)
+
+
+def _save(manifest):
+    with open(MANIFEST, "w") as f:
+        json.dump(manifest, f, indent=1, sort_keys=True)
+        f.write("\n")
+
+
+def rasterize(force=False, max_workers=None):
+    """Render what's out of date; returns (rendered, unchanged) lists of
+    PNG paths relative to the top level directory.
+
+    Raises InkscapeNotFound if anything needs rendering and Inkscape
+    can't be found.
+
+    """
+    try:
+        with open(MANIFEST) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    todo, unchanged = [], []
+    adopted = False
+    for svg, png, dpi, source_hash in jobs():
+        key = os.path.relpath(png, HERE)
+        png_hash = _file_sha1(png)
+        if not force and key not in manifest and png_hash is not None:
+            manifest[key] = [source_hash, png_hash]
+            adopted = True
+        if not force and manifest.get(key) == [source_hash, png_hash]:
+            unchanged.append(key)
+        else:
+            todo.append((svg, png, dpi, source_hash))
+
+    if adopted:
+        _save(manifest)
+
+    if todo and shutil.which(_inkscape()) is None:
+        raise InkscapeNotFound(
+            "%s not found; %d images are out of date"
+            % (_inkscape(), len(todo))
+        )
+
+    if todo:
+        with ProcessPoolExecutor(max_workers=max_workers) as pool:
+            results = pool.map(
+                render, *zip(*[(svg, png, dpi) for svg, png, dpi, _ in todo])
+            )
+            for (svg, png, dpi, source_hash), png_hash in zip(todo, results):
+                manifest[os.path.relpath(png, HERE)] = [source_hash, png_hash]
+        _save(manifest)
+
+    return [os.path.relpath(job[1], HERE) for job in todo], unchanged
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument(
+        "--force", action="store_true", help="render every image"
+    )
+    parser.add_argument("-j", "--jobs", type=int, help="worker processes")
+    options = parser.parse_args(argv)
+
+    try:
+        rendered, unchanged = rasterize(options.force, options.jobs)
+    except InkscapeNotFound as err:
+        print(err, file=sys.stderr)
+        return 1
+    for path in rendered:
+        print("rendered %s" % path)
+    print("%d rendered, %d unchanged" % (len(rendered), len(unchanged)))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
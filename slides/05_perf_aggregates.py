@@ -0,0 +1,336 @@
+### slide::
+### title:: Per-row Aggregates at Scale
+# In the "Joins / Aliases / Subqueries / CTEs" section we counted email
+# addresses per user several ways.  Here we build the same two tables,
+# fill them with a lot more rows, and compare each form.
+
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy import ForeignKey, Integer, String
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+)
+
+address_table = Table(
+    "email_address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", ForeignKey("user_account.id"), nullable=False),
+    Column("email_address", String(100), nullable=False),
+)
+
+### slide:: p
+# new SQLite database.  NUM_USERS can be raised to see how each form
+# scales; every fifth user has no addresses at all.
+
+import random
+
+from sqlalchemy import create_engine
+
+NUM_USERS = 5000
+
+engine = create_engine("sqlite://")
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+random.seed(5)
+with engine.begin() as conn:
+    conn.execute(
+        user_table.insert(),
+        [
+            {"id": i, "username": f"user{i}", "fullname": f"User {i}"}
+            for i in range(1, NUM_USERS + 1)
+        ],
+    )
+    conn.execute(
+        address_table.insert(),
+        [
+            {"user_id": i, "email_address": f"user{i}_{j}@example.com"}
+            for i in range(1, NUM_USERS + 1)
+            if i % 5
+            for j in range(random.randint(1, 6))
+        ],
+    )
+
+### slide::
+# a small helper that runs a statement a few times and reports the best
+# wall clock time, along with the rows so we can check each form agrees.
+
+import time
+
+
+def run(connection, stmt, label, repeat=3):
+    best = None
+    for _ in range(repeat):
+        now = time.perf_counter()
+        rows = connection.execute(stmt).all()
+        elapsed = time.perf_counter() - now
+        best = elapsed if best is None else min(best, elapsed)
+    print(f"{label:<32} {len(rows):>8} rows  {best * 1000:9.2f} ms")
+    return sorted(rows)
+
+
+connection = engine.connect()
+
+### slide::
+### title:: The forms being compared
+# 1. JOIN to a GROUP BY subquery, as shown earlier.  Note this is an
+#    *inner* join; users with no addresses are dropped entirely.
+
+from sqlalchemy import select, func
+
+address_select = select(
+    address_table.c.user_id, func.count(address_table.c.id).label("count")
+).group_by(address_table.c.user_id)
+
+address_subq = address_select.subquery()
+
+join_subq = (
+    select(user_table.c.username, address_subq.c.count)
+    .join(address_subq)
+)
+
+### slide::
+# 2. the same with a CTE
+
+address_cte = address_select.cte()
+
+join_cte = (
+    select(user_table.c.username, address_cte.c.count)
+    .join(address_cte)
+)
+
+### slide::
+# 3. LEFT OUTER JOIN with coalesce(), as in the ORM section.  This is the
+#    form that returns the same rows as the correlated subquery.
+
+outerjoin_subq = (
+    select(user_table.c.username, func.coalesce(address_subq.c.count, 0))
+    .outerjoin(address_subq, user_table.c.id == address_subq.c.user_id)
+)
+
+### slide::
+# 4. the auto-correlated scalar subquery; the SELECT inside is
+#    conceptually run once for every row in user_account.
+
+address_corr = (
+    select(func.count(address_table.c.id))
+    .where(user_table.c.id == address_table.c.user_id)
+    .scalar_subquery()
+)
+
+correlated = select(user_table.c.username, address_corr)
+
+### slide::
+# 5. a window function.  The count is computed over a partition of the
+#    joined rows, then DISTINCT collapses them back to one per user.
+
+window = (
+    select(
+        user_table.c.username,
+        func.count(address_table.c.id).over(partition_by=user_table.c.id),
+    )
+    .outerjoin(address_table)
+    .distinct()
+)
+
+### slide:: p
+### title:: Results, no index on user_id
+# email_address.user_id has no index, which is the worst case for
+# the correlated form.
+
+run(connection, join_subq, "join, group by subquery")
+run(connection, join_cte, "join, group by cte")
+baseline = run(connection, outerjoin_subq, "outer join + coalesce")
+run(connection, window, "window function") == baseline
+
+### slide:: p
+# the correlated version; lower NUM_USERS first if this is slow!
+
+run(connection, correlated, "correlated scalar subquery") == baseline
+
+### slide::
+### title:: Rewriting a correlated subquery
+# uncorrelate() rewrites each correlated scalar subquery in the columns
+# clause of a select() into a LEFT OUTER JOIN against a GROUP BY subquery.
+# It handles subqueries that select a single aggregate and whose WHERE
+# clause is a series of AND'ed comparisons; those comparisons which
+# refer to the enclosing SELECT become the ON clause and GROUP BY, the
+# rest stay inside the subquery.  The outer comparisons have to be
+# equalities against a single table of the enclosing SELECT, and nothing
+# else may refer to it.  Anything else is left alone.
+
+import operator
+
+from sqlalchemy import and_
+from sqlalchemy.sql import functions
+from sqlalchemy.sql.elements import BinaryExpression, Label
+from sqlalchemy.sql.selectable import ScalarSelect
+from sqlalchemy.sql.util import find_tables
+
+
+def uncorrelate(stmt):
+    outer_froms = set(stmt.froms)
+    new_columns = []
+    joins = []
+
+    for col in stmt.selected_columns:
+        name = col.name if isinstance(col, Label) else None
+        element = col.element if isinstance(col, Label) else col
+
+        split = _split_correlated(element, outer_froms)
+        if split is None:
+            new_columns.append(col)
+            continue
+
+        aggregate, pairs, criteria = split
+
+        inner_cols = [inner for outer, inner in pairs]
+        subq = (
+            select(*inner_cols, aggregate.label("value"))
+            .where(*criteria)
+            .group_by(*inner_cols)
+            .subquery()
+        )
+        onclause = and_(
+            *[
+                outer == subq.c[inner.key]
+                for outer, inner in pairs
+            ]
+        )
+        joins.append((pairs[0][0].table, subq, onclause))
+
+        # count() of no rows is zero, while a LEFT OUTER JOIN gives NULL;
+        # other aggregates return NULL either way
+        value = subq.c.value
+        if isinstance(aggregate, functions.count):
+            value = func.coalesce(value, 0)
+        new_columns.append(value.label(name) if name else value)
+
+    if not joins:
+        return stmt
+
+    new_stmt = stmt.with_only_columns(*new_columns)
+    for left, subq, onclause in joins:
+        new_stmt = new_stmt.join_from(left, subq, onclause, isouter=True)
+    return new_stmt
+
+
+def _split_correlated(element, outer_froms):
+    if not isinstance(element, ScalarSelect):
+        return None
+    subselect = element.element
+    columns = list(subselect.selected_columns)
+    if (
+        len(columns) != 1
+        or not isinstance(columns[0], functions.GenericFunction)
+        or subselect._group_by_clauses
+        or subselect.whereclause is None
+    ):
+        return None
+
+    criteria = []
+    pairs = []
+    for crit in _and_clauses(subselect.whereclause):
+        if (
+            isinstance(crit, BinaryExpression)
+            and crit.operator is operator.eq
+            and hasattr(crit.left, "table")
+            and hasattr(crit.right, "table")
+        ):
+            left_outer = crit.left.table in outer_froms
+            right_outer = crit.right.table in outer_froms
+            if left_outer and not right_outer:
+                pairs.append((crit.left, crit.right))
+                continue
+            elif right_outer and not left_outer:
+                pairs.append((crit.right, crit.left))
+                continue
+        criteria.append(crit)
+
+    if not pairs or len({outer.table for outer, inner in pairs}) != 1:
+        return None
+
+    # anything else referring to the enclosing SELECT, such as
+    # "address.id > user_account.id", can't be moved into a GROUP BY
+    # subquery; it would add the outer table to the subquery's FROM
+    for remaining in criteria + columns:
+        if any(
+            table in outer_froms
+            for table in find_tables(remaining, check_columns=True)
+        ):
+            return None
+    return columns[0], pairs, criteria
+
+
+def _and_clauses(clause):
+    if getattr(clause, "operator", None) is operator.and_:
+        return list(clause.clauses)
+    else:
+        return [clause]
+
+
+### slide:: i
+# the correlated statement, rewritten
+
+rewritten = uncorrelate(correlated)
+print(rewritten)
+
+### slide:: p
+# same rows, without the per-row subquery
+
+run(connection, rewritten, "uncorrelated") == baseline
+
+### slide:: i
+# non-correlated criteria stay inside the subquery, and labels carry over
+
+gmail_corr = (
+    select(func.count(address_table.c.id))
+    .where(user_table.c.id == address_table.c.user_id)
+    .where(address_table.c.email_address.like("%_1@%"))
+    .scalar_subquery()
+    .label("second_addresses")
+)
+
+print(
+    uncorrelate(
+        select(user_table.c.username, gmail_corr).where(
+            user_table.c.id < 10
+        )
+    )
+)
+
+### slide:: p
+### title:: Results, with an index
+# add the index that a foreign key column should generally have and
+# run them all again.  SQLite can now satisfy each correlated lookup
+# from the index, so the gap mostly closes; how well a given database
+# handles the correlated form varies a lot, while the rewritten form
+# behaves the same everywhere.
+
+from sqlalchemy import Index
+
+Index("ix_email_address_user_id", address_table.c.user_id).create(connection)
+
+for label, stmt in [
+    ("join, group by subquery", join_subq),
+    ("join, group by cte", join_cte),
+    ("outer join + coalesce", outerjoin_subq),
+    ("window function", window),
+    ("correlated scalar subquery", correlated),
+    ("uncorrelated", rewritten),
+]:
+    run(connection, stmt, label)
+
+### slide::
+connection.close()
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,294 @@
+### slide::
+### title:: Compiling Large Expression Trees
+# In the "Core SQL" section we combined criteria with and_() and or_()
+# and called str() to see the SQL.  A search screen that builds its
+# WHERE clause from user input can produce thousands of such
+# comparisons; here we time how long they take to compile and to
+# generate a cache key, and how the shape of the tree matters.
+
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy import Integer, String
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+)
+
+### slide::
+# three ways to build "the same" criteria.  wide() passes every
+# comparison to a single or_(); folded() adds them one at a time, the
+# way a loop over form fields tends to; mixed() ANDs together groups of
+# OR'ed values, one group per field of a filter form, folded the same way.
+
+import functools
+
+from sqlalchemy import and_, or_
+
+
+def comparisons(n):
+    return [user_table.c.id == i for i in range(n)]
+
+
+def wide(n):
+    return or_(*comparisons(n))
+
+
+def folded(n):
+    return functools.reduce(or_, comparisons(n))
+
+
+def mixed(n, per_group=10):
+    criteria = None
+    for start in range(0, n, per_group):
+        group = functools.reduce(
+            or_,
+            [
+                user_table.c.username == f"user{i}"
+                for i in range(start, min(start + per_group, n))
+            ],
+        )
+        criteria = group if criteria is None else and_(criteria, group)
+    return criteria
+
+
+### slide:: i
+# wide() is one flat list; folded() nests a new OR around the previous
+# one for each comparison, even though the SQL reads the same.
+
+
+def depth(clause):
+    level = 0
+    while getattr(clause, "clauses", None):
+        clause = clause.clauses[0]
+        level += 1
+    return level
+
+
+print(wide(5))
+print(folded(5))
+depth(wide(100)), depth(folded(100))
+
+### slide::
+# a helper that reports the best time to compile a statement and to
+# generate its cache key.  The cache key is memoized on the statement,
+# so it's timed on a fresh select() each time around.  Both walk the
+# tree recursively, so a deep enough tree raises RecursionError.
+
+import time
+
+from sqlalchemy import select
+
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        now = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - now
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def timed(fn):
+    try:
+        return f"{best_of(fn):9.2f} ms"
+    except RecursionError:
+        return f"{'recursion':>12}"
+
+
+def report(label, criteria):
+    stmt = select(user_table).where(criteria)
+    compile_time = timed(lambda: str(stmt.compile()))
+    key_time = timed(
+        lambda: select(user_table).where(criteria)._generate_cache_key()
+    )
+    print(f"{label:<20} compile {compile_time}   cache key {key_time}")
+
+
+### slide:: p
+### title:: Results, by size and shape
+# each shape at growing sizes.  Time grows linearly for the wide form;
+# the nested forms cost more per comparison, and fail entirely once
+# they're more than a few hundred levels deep.
+
+for n in (10, 100, 1000, 5000):
+    report(f"wide {n}", wide(n))
+    report(f"folded {n}", folded(n))
+    report(f"mixed {n}", mixed(n))
+
+### slide::
+### title:: Flattening nested clauses
+# flatten() rewrites nested clauses joined by the same operator into a
+# single and_() or or_(), so that "(a OR b) OR c" becomes "a OR b OR c".
+# Groupings are unwrapped; a clause with the other operator keeps its
+# own parenthesis, and is flattened in turn.  It uses a stack rather
+# than recursion, as the point is to handle trees too deep for that.
+
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import BooleanClauseList, Grouping
+
+
+def flatten(clause):
+    while isinstance(clause, Grouping):
+        clause = clause.element
+    if not isinstance(clause, BooleanClauseList):
+        return clause
+
+    result = []
+    # each entry is the operator, the flattened children so far, an
+    # iterator over the children not looked at yet, and the list that
+    # the finished clause is added to.  A nested clause with the same
+    # operator shares its parent's list and adds nothing when done.
+    stack = [(clause.operator, [], iter(clause.clauses), result)]
+    while stack:
+        operator, flat, children, parent = stack[-1]
+        for child in children:
+            while isinstance(child, Grouping):
+                child = child.element
+            if not isinstance(child, BooleanClauseList):
+                flat.append(child)
+            elif child.operator is operator:
+                stack.append((operator, flat, iter(child.clauses), None))
+                break
+            else:
+                stack.append((child.operator, [], iter(child.clauses), flat))
+                break
+        else:
+            stack.pop()
+            if parent is not None:
+                if operator is operators.and_:
+                    parent.append(and_(*flat))
+                else:
+                    parent.append(or_(*flat))
+    return result[0]
+
+
+### slide:: i
+# the nested ORs are now a single list; the mixed tree keeps one level
+# of parenthesis for each group.
+
+print(flatten(folded(5)))
+print(flatten(mixed(20, per_group=3)))
+depth(flatten(folded(100))), depth(flatten(mixed(100)))
+
+### slide:: p
+# the SQL and the parameters are the same as the wide form's
+
+stmt = select(user_table).where(wide(100))
+flat_stmt = select(user_table).where(flatten(folded(100)))
+compiled, flat_compiled = stmt.compile(), flat_stmt.compile()
+(str(compiled) == str(flat_compiled), compiled.params == flat_compiled.params)
+
+### slide:: p
+### title:: Results, flattened
+# flatten() is itself linear and costs much less than compiling; the
+# flattened trees compile at the same speed as the wide form, at any size.
+
+for n in (10, 100, 1000, 5000):
+    for label, build in [("folded", folded), ("mixed", mixed)]:
+        criteria = build(n)
+        elapsed = best_of(lambda: flatten(criteria))
+        print(f"flatten {label} {n:<6}     {elapsed:9.2f} ms")
+        report(f"flattened {label} {n}", flatten(criteria))
+
+### slide::
+### title:: Many values for one column
+# when the comparisons are all "column == value" against the same column,
+# as with a multi-select, an IN does better still.  collapse_in() turns
+# the equality comparisons of a flattened OR which share a column into
+# one col.in_() and leaves the rest alone.  Only comparisons to a literal
+# value are collapsed; a bindparam() whose value is given when the
+# statement runs, or comes from a callable, stays as it is.
+
+import operator
+
+from sqlalchemy.sql.elements import BinaryExpression, BindParameter
+
+
+def collapse_in(clause):
+    clause = flatten(clause)
+    if not (
+        isinstance(clause, BooleanClauseList)
+        and clause.operator is operators.or_
+    ):
+        return clause
+
+    values = {}
+    rest = []
+    for crit in clause.clauses:
+        if (
+            isinstance(crit, BinaryExpression)
+            and crit.operator is operator.eq
+            and isinstance(crit.right, BindParameter)
+            and not crit.right.required
+            and crit.right.callable is None
+            and hasattr(crit.left, "table")
+        ):
+            values.setdefault(crit.left, []).append(crit.right.value)
+        else:
+            rest.append(crit)
+    return or_(*[col.in_(vals) for col, vals in values.items()], *rest)
+
+
+### slide:: i
+print(collapse_in(folded(5)))
+
+### slide:: p
+# IN renders a single "expanding" parameter, which is turned into the
+# list of values only when the statement is run.  The compiled form and
+# the cache key are then the same size for any number of values, so
+# every search with this shape shares one entry in the engine's
+# compiled cache rather than each count of values getting its own.
+
+for n in (10, 100, 1000, 5000):
+    report(f"in_() {n}", collapse_in(folded(n)))
+
+small = select(user_table).where(collapse_in(folded(10)))
+large = select(user_table).where(collapse_in(folded(5000)))
+small._generate_cache_key() == large._generate_cache_key()
+
+### slide:: p
+### title:: In practice
+# run a few searches of each kind against a database.  Each execution
+# generates a cache key, and each new cache key compiles the statement
+# again; the folded form also needs recursion headroom we don't have.
+
+from sqlalchemy import create_engine
+
+engine = create_engine("sqlite://")
+with engine.begin() as conn:
+    metadata.create_all(conn)
+    conn.execute(
+        user_table.insert(),
+        [
+            {"id": i, "username": f"user{i}", "fullname": f"User {i}"}
+            for i in range(10000)
+        ],
+    )
+
+
+def search(connection, build, sizes):
+    now = time.perf_counter()
+    for n in sizes:
+        connection.execute(select(user_table).where(build(n))).all()
+    return (time.perf_counter() - now) * 1000
+
+
+sizes = [50, 100, 150, 100, 50] * 4
+with engine.connect() as connection:
+    for label, build in [
+        ("wide", wide),
+        ("folded", folded),
+        ("flattened", lambda n: flatten(folded(n))),
+        ("in_()", lambda n: collapse_in(folded(n))),
+    ]:
+        print(f"{label:<12} {search(connection, build, sizes):9.2f} ms")
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,276 @@
+### slide::
+### title:: Keyset Pagination
+# Listing slides so far use .order_by() and then fetch the entire result.
+# Paging through a large table with LIMIT / OFFSET gets slower for every
+# page, since the database has to count past all the rows being skipped.
+# "Keyset" or "seek" pagination instead resumes from the last row seen,
+# using a WHERE clause against the ORDER BY columns.
+
+from sqlalchemy import MetaData, Table, Column, Index
+from sqlalchemy import Integer, String
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+)
+
+# keyset pagination relies on an index that matches the ORDER BY
+Index("ix_user_account_username", user_table.c.username, user_table.c.id)
+
+### slide:: p
+# a SQLite database with a good number of rows.  usernames repeat, so that
+# ordering by username alone is not enough to identify a row.
+
+from sqlalchemy import create_engine
+
+NUM_USERS = 100000
+
+engine = create_engine("sqlite://")
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+    conn.execute(
+        user_table.insert(),
+        [
+            {
+                "id": i,
+                "username": f"user{i % 25000:05d}",
+                "fullname": f"User {i}",
+            }
+            for i in range(1, NUM_USERS + 1)
+        ],
+    )
+
+### slide::
+### title:: A keyset paginator
+# paginate() accepts any select() that has an ORDER BY, Core or ORM, and
+# yields one Result per page.  It adds the ORDER BY expressions to the
+# columns clause so it can see their values in the last row of each page,
+# then uses them to build the WHERE clause for the next page.  The primary
+# key of the leading table is added to the ORDER BY as a tie-breaker if it
+# is not already present.  NULL values in ORDER BY columns are not
+# supported.
+
+from sqlalchemy import and_, or_, tuple_
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression
+
+
+def paginate(executor, stmt, page_size):
+    keys = _keyset_columns(stmt)
+    labeled = [col.label(f"_keyset_{i}") for i, (col, _) in enumerate(keys)]
+    paged = (
+        stmt.order_by(None)
+        .order_by(*[col.desc() if desc else col for col, desc in keys])
+        .add_columns(*labeled)
+        .limit(page_size)
+    )
+
+    criteria = None
+    while True:
+        page = paged if criteria is None else paged.where(criteria)
+        frozen = executor.execute(page).freeze()
+
+        rows = frozen().all()
+        if not rows:
+            return
+
+        num_cols = len(frozen().keys()) - len(keys)
+        yield frozen().columns(*range(num_cols))
+
+        if len(rows) < page_size:
+            return
+        criteria = _keyset_criteria(keys, rows[-1][num_cols:])
+
+
+def _keyset_columns(stmt):
+    keys = []
+    for clause in stmt._order_by_clauses:
+        if isinstance(clause, UnaryExpression) and clause.modifier in (
+            operators.asc_op,
+            operators.desc_op,
+        ):
+            keys.append((clause.element, clause.modifier is operators.desc_op))
+        else:
+            keys.append((clause, False))
+
+    if not keys:
+        raise ValueError("statement must have an ORDER BY to be paginated")
+
+    # tie-break on primary key
+    table = next((frm for frm in stmt.froms if frm.primary_key), None)
+    if table is None:
+        raise ValueError(
+            "statement must select from a table with a primary key, "
+            "to break ties between rows with the same ORDER BY values"
+        )
+    for pk_col in table.primary_key:
+        if not any(pk_col.shares_lineage(col) for col, _ in keys):
+            keys.append((pk_col, False))
+    return keys
+
+
+def _keyset_criteria(keys, values):
+    # with all-ascending or all-descending keys, a row value comparison
+    # (a, b) > (:a, :b) is used, which SQLite and most other databases
+    # can satisfy directly from a matching index
+    if len(set(desc for _, desc in keys)) == 1:
+        lhs = tuple_(*[col for col, _ in keys])
+        rhs = tuple_(*values)
+        return lhs < rhs if keys[0][1] else lhs > rhs
+
+    # mixed directions need to be spelled out:
+    # a > :a OR (a = :a AND b < :b) OR ...
+    clauses = []
+    for i, (col, desc) in enumerate(keys):
+        seek = col < values[i] if desc else col > values[i]
+        clauses.append(
+            and_(*[c == v for (c, _), v in zip(keys[:i], values[:i])], seek)
+        )
+    return or_(*clauses)
+
+
+### slide:: i
+# the statement for the second page.  note the username ordering has had
+# user_account.id added as a tie-breaker.
+
+from sqlalchemy import select
+
+stmt = select(user_table).order_by(user_table.c.username)
+
+keys = _keyset_columns(stmt)
+print(_keyset_criteria(keys, ["user00001", 50001]))
+
+### slide:: p
+# walking through pages.  each page is a Result.
+
+connection = engine.connect()
+
+for page_num, page in enumerate(paginate(connection, stmt, 5)):
+    print(page.all())
+    if page_num == 2:
+        break
+
+### slide:: i
+# mixed ascending / descending ORDER BY spells out the comparison
+
+stmt = select(user_table).order_by(
+    user_table.c.username.desc(), user_table.c.id
+)
+print(_keyset_criteria(_keyset_columns(stmt), ["user00001", 50001]))
+
+### slide:: p
+### title:: ORM statements
+# the same function works with an ORM select() and a Session; the
+# Result of each page can use .scalars() as usual.
+
+from sqlalchemy.orm import registry, Session
+
+
+class User:
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+mapper_registry = registry()
+mapper_registry.map_imperatively(User, user_table)
+
+session = Session(engine, future=True)
+
+for page_num, page in enumerate(
+    paginate(session, select(User).order_by(User.id.desc()), 3)
+):
+    print(page.scalars().all())
+    if page_num == 2:
+        break
+
+session.close()
+
+### slide::
+### title:: Keyset vs. LIMIT / OFFSET
+# fetch one page at increasing depths using both approaches.  For the
+# keyset version we start from the key of the row just before the page,
+# as a paginated UI would have kept it from the previous page.
+
+import time
+
+PAGE_SIZE = 100
+
+by_username = select(user_table).order_by(
+    user_table.c.username, user_table.c.id
+)
+all_keys = connection.execute(
+    select(user_table.c.username, user_table.c.id).order_by(
+        user_table.c.username, user_table.c.id
+    )
+).all()
+
+
+def offset_page(offset):
+    return connection.execute(
+        by_username.limit(PAGE_SIZE).offset(offset)
+    ).all()
+
+
+def keyset_page(offset):
+    criteria = _keyset_criteria(
+        _keyset_columns(by_username), all_keys[offset - 1]
+    )
+    return connection.execute(
+        by_username.where(criteria).limit(PAGE_SIZE)
+    ).all()
+
+
+def timed(fn, *args):
+    now = time.perf_counter()
+    result = fn(*args)
+    return result, (time.perf_counter() - now) * 1000
+
+
+### slide:: p
+
+for offset in (1000, 10000, 50000, NUM_USERS - PAGE_SIZE):
+    offset_rows, offset_ms = timed(offset_page, offset)
+    keyset_rows, keyset_ms = timed(keyset_page, offset)
+    assert offset_rows == keyset_rows
+    print(
+        f"page at row {offset:>7}:  OFFSET {offset_ms:8.2f} ms   "
+        f"keyset {keyset_ms:8.2f} ms"
+    )
+
+### slide:: p
+# walking the whole table.  OFFSET does O(n) work for every page, so
+# the total is O(n^2); keyset stays linear.
+
+def walk_offset():
+    offset = 0
+    while True:
+        rows = offset_page(offset)
+        if not rows:
+            return offset
+        offset += len(rows)
+
+
+def walk_keyset():
+    return sum(
+        len(page.all())
+        for page in paginate(connection, by_username, PAGE_SIZE)
+    )
+
+
+total, offset_ms = timed(walk_offset)
+print(f"OFFSET: {total} rows in {offset_ms:9.2f} ms")
+total, keyset_ms = timed(walk_keyset)
+print(f"keyset: {total} rows in {keyset_ms:9.2f} ms")
+
+### slide::
+connection.close()
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,538 @@
+### slide::
+### title:: Caching Query Results
+# Every select() we've executed so far goes to the database, even when
+# the same statement with the same parameters was just run.  Here we build
+# an opt-in cache of results, keyed on the statement's *cache key* - the
+# same structure SQLAlchemy uses to cache the compiled form of a statement -
+# plus the bound parameter values.
+
+from sqlalchemy import MetaData, Table, Column, ForeignKey
+from sqlalchemy import Integer, String
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+)
+
+address_table = Table(
+    "email_address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", ForeignKey("user_account.id"), nullable=False),
+    Column("email_address", String(100), nullable=False),
+)
+
+### slide:: p
+# new SQLite database with some users.
+
+from sqlalchemy import create_engine
+
+engine = create_engine("sqlite://", future=True)
+with engine.begin() as conn:
+    metadata.create_all(conn)
+    conn.execute(
+        user_table.insert(),
+        [
+            {"username": "spongebob", "fullname": "Spongebob Squarepants"},
+            {"username": "sandy", "fullname": "Sandy Cheeks"},
+            {"username": "patrick", "fullname": "Patrick Star"},
+        ]
+        + [
+            {"username": f"user{i}", "fullname": f"User {i}"}
+            for i in range(1000)
+        ],
+    )
+
+### slide::
+### title:: The cache key
+# a statement's cache key is made of its structure, along with the
+# bound parameters that were extracted from it.
+
+from sqlalchemy import select
+
+stmt = select(user_table).where(user_table.c.username == "spongebob")
+
+cache_key = stmt._generate_cache_key()
+cache_key.bindparams
+
+### slide:: i
+# two statements that differ only in a literal value have the same key,
+# and different bound values.
+
+other = select(user_table).where(user_table.c.username == "sandy")
+other_key = other._generate_cache_key()
+
+cache_key.key == other_key.key
+[b.effective_value for b in other_key.bindparams]
+
+### slide::
+### title:: Backends
+# Results are stored as FrozenResult objects, produced by Result.freeze().
+# Calling a FrozenResult returns a new Result each time.  Each cache entry
+# also records the names of the tables the statement SELECTs from, so
+# entries can be removed when those tables change.
+#
+# MemoryBackend is an in-process LRU with an optional time to live.
+
+import collections
+import threading
+import time
+
+
+class MemoryBackend:
+    def __init__(self, max_size=1000, ttl=None):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = collections.OrderedDict()
+        self._by_table = collections.defaultdict(set)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            try:
+                expires, tables, frozen = self._entries[key]
+            except KeyError:
+                return None
+            if expires is not None and expires < time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return frozen
+
+    def set(self, key, frozen, tables):
+        expires = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (expires, tables, frozen)
+            for name in tables:
+                self._by_table[name].add(key)
+            while len(self._entries) > self.max_size:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, tables):
+        with self._lock:
+            for name in tables:
+                for key in list(self._by_table.pop(name, ())):
+                    self._remove(key)
+
+    def _remove(self, key):
+        expires, tables, frozen = self._entries.pop(key)
+        for name in tables:
+            self._by_table[name].discard(key)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+### slide::
+# SQLiteBackend stores pickled results in a SQLite file, so they survive
+# a restart and can be shared by several processes on the same machine.
+# Keys are hashed, as the cache key itself isn't serializable.  The hash
+# is of a form of the key that's the same in every process: tables,
+# mappers, classes and functions by name rather than by repr(), which for
+# many of them includes a memory address.  A key with anything else that
+# can't be given such a form isn't stored.  ORM results pickle the
+# objects they contain, so the mapped classes have to be importable for
+# this backend to be used with them.
+
+import hashlib
+import pickle
+import re
+import sqlite3
+
+from sqlalchemy import Table
+from sqlalchemy.types import TypeEngine
+from sqlalchemy.orm import Mapper
+from sqlalchemy.util.langhelpers import _symbol
+
+_address = re.compile(r" at 0x[0-9a-fA-F]+")
+
+
+def _qualified_name(obj):
+    return "%s.%s" % (obj.__module__, obj.__qualname__)
+
+
+def stable_key(key):
+    """Return a form of a cache key that's the same in every process,
+    or None if there isn't one."""
+    try:
+        return _stable(key)
+    except ValueError:
+        return None
+
+
+def _stable(key):
+    if isinstance(key, (tuple, list)):
+        items = [_stable(item) for item in key]
+        if key and isinstance(key[0], type) and issubclass(key[0], TypeEngine):
+            # a type's arguments, which come from a set, in any order
+            items[1:] = sorted(items[1:], key=repr)
+        return ("tuple", tuple(items))
+    elif isinstance(key, _symbol):
+        # an int, but with a value that's a hash of its name
+        return ("symbol", key.name)
+    elif key is None or isinstance(key, (str, bytes, int, float, bool)):
+        return key
+    elif isinstance(key, Table):
+        return ("table", key.fullname)
+    elif isinstance(key, Mapper):
+        return ("mapper", _qualified_name(key.class_))
+    elif isinstance(key, type) or callable(key):
+        name = getattr(key, "__qualname__", "<locals>")
+        if "<locals>" in name or "<lambda>" in name:
+            raise ValueError(key)
+        return ("name", _qualified_name(key))
+
+    # dates, Decimal and the like
+    text = repr(key)
+    if _address.search(text):
+        raise ValueError(key)
+    return ("repr", text)
+
+
+class SQLiteBackend:
+    def __init__(self, path, ttl=None):
+        self.ttl = ttl
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._conn:
+            self._conn.execute(
+                "create table if not exists cache_entry "
+                "(key varchar primary key, expires float, value blob)"
+            )
+            self._conn.execute(
+                "create table if not exists cache_table "
+                "(key varchar, table_name varchar)"
+            )
+            self._conn.execute(
+                "create index if not exists ix_cache_table_name "
+                "on cache_table (table_name)"
+            )
+
+    def _digest(self, key):
+        stable = stable_key(key)
+        if stable is None:
+            return None
+        return hashlib.sha1(repr(stable).encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        digest = self._digest(key)
+        if digest is None:
+            return None
+        with self._lock:
+            row = self._conn.execute(
+                "select expires, value from cache_entry where key=?",
+                (digest,),
+            ).fetchone()
+        if row is None or (row[0] is not None and row[0] < time.time()):
+            return None
+        return pickle.loads(row[1])
+
+    def set(self, key, frozen, tables):
+        digest = self._digest(key)
+        if digest is None:
+            return
+        expires = time.time() + self.ttl if self.ttl else None
+        with self._lock, self._conn:
+            self._conn.execute(
+                "insert or replace into cache_entry (key, expires, value) "
+                "values (?, ?, ?)",
+                (digest, expires, pickle.dumps(frozen)),
+            )
+            self._conn.execute(
+                "delete from cache_table where key=?", (digest,)
+            )
+            self._conn.executemany(
+                "insert into cache_table (key, table_name) values (?, ?)",
+                [(digest, name) for name in tables],
+            )
+
+    def invalidate(self, tables):
+        tables = list(tables)
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "delete from cache_entry where key in "
+                "(select key from cache_table where table_name=?)",
+                [(name,) for name in tables],
+            )
+            self._conn.executemany(
+                "delete from cache_table where table_name=?",
+                [(name,) for name in tables],
+            )
+
+
+### slide::
+### title:: ResultCache
+# ResultCache.execute() is used in place of connection.execute() or
+# session.execute() for those statements that should be cached.  It
+# returns a Result in either case.  A statement that SQLAlchemy can't
+# generate a cache key for is simply executed.
+#
+# For a Session, the rows are cached as detached copies of the objects,
+# made by pickling them as they were loaded; the Session's own objects
+# are expired when it commits, and a cache of those would load them all
+# again.  On the way out, each object is passed to Session.merge() with
+# load=False, which places a copy of it in the Session's identity map
+# without emitting SQL.
+#
+# listen() attaches an "after_execute" hook to an Engine that notes the
+# tables of every INSERT, UPDATE or DELETE, including those emitted by
+# the ORM unit of work, and invalidates their entries when the
+# transaction commits.  Until then, a statement against one of those
+# tables may see the transaction's own changes, so it bypasses the cache;
+# anything else the transaction reads is admitted when it commits.  A
+# rollback discards both.  A transaction that hasn't written anything
+# only sees committed rows, and its results are admitted right away.
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from sqlalchemy.sql.util import find_tables
+
+
+class ResultCache:
+    def __init__(self, backend):
+        self.backend = backend
+        self.hits = self.misses = 0
+
+    def execute(self, executor, stmt, params=None):
+        key = self._cache_key(stmt, params)
+        if isinstance(executor, Session):
+            invalidations, admissions = self._pending(executor.connection())
+        else:
+            invalidations, admissions = self._pending(executor)
+        if key is None or (invalidations and _tables(stmt) & invalidations):
+            # can't be cached, or may see this transaction's changes
+            return executor.execute(stmt, params)
+
+        frozen = self.backend.get(key)
+        if frozen is None:
+            self.misses += 1
+            tables = _tables(stmt)
+            frozen = executor.execute(stmt, params).freeze()
+            if isinstance(executor, Session):
+                frozen = pickle.loads(pickle.dumps(frozen))
+            if invalidations:
+                admissions.append((key, frozen, tables))
+            else:
+                self.backend.set(key, frozen, tables)
+        else:
+            self.hits += 1
+
+        if isinstance(executor, Session):
+            frozen = self._merge(executor, frozen)
+        return frozen()
+
+    def _merge(self, session, frozen):
+        return frozen.with_new_rows(
+            [
+                tuple(
+                    session.merge(value, load=False)
+                    if _is_mapped(value)
+                    else value
+                    for value in row
+                )
+                for row in frozen.rewrite_rows()
+            ]
+        )
+
+    def _cache_key(self, stmt, params):
+        cache_key = stmt._generate_cache_key()
+        if cache_key is None:
+            return None
+        values = tuple(
+            _hashable(bind.effective_value) for bind in cache_key.bindparams
+        )
+        if params:
+            values += tuple(
+                (name, _hashable(value))
+                for name, value in sorted(params.items())
+            )
+        return (cache_key.key, values)
+
+    def _pending(self, conn):
+        # (tables written, results read) by the connection's transaction
+        return conn.info.get(self, (set(), []))
+
+    def listen(self, engine):
+        event.listen(engine, "after_execute", self._after_execute)
+        event.listen(engine, "commit", self._commit)
+        event.listen(engine, "rollback", self._rollback)
+
+    def _after_execute(self, conn, clauseelement, *arg):
+        if getattr(clauseelement, "is_dml", False):
+            invalidations, admissions = conn.info.setdefault(
+                self, (set(), [])
+            )
+            invalidations.add(clauseelement.table.name)
+
+    def _commit(self, conn):
+        invalidations, admissions = conn.info.pop(self, (set(), []))
+        if invalidations:
+            self.backend.invalidate(invalidations)
+        for key, frozen, tables in admissions:
+            self.backend.set(key, frozen, tables)
+
+    def _rollback(self, conn):
+        conn.info.pop(self, None)
+
+
+def _tables(stmt):
+    return {table.name for table in find_tables(stmt, check_columns=True)}
+
+
+def _is_mapped(value):
+    insp = inspect(value, raiseerr=False)
+    return insp is not None and insp.is_instance
+
+
+def _hashable(value):
+    # IN parameters are lists
+    if isinstance(value, list):
+        return tuple(value)
+    else:
+        return value
+
+
+### slide:: p
+# the first execution is a miss and runs the SELECT; the second is served
+# from the cache.
+
+cache = ResultCache(MemoryBackend(max_size=500, ttl=60))
+cache.listen(engine)
+
+with engine.connect() as conn:
+    print(cache.execute(conn, stmt).all())
+    print(cache.execute(conn, stmt).all())
+
+cache.hits, cache.misses
+
+### slide:: p
+# a different parameter value is a different entry.
+
+with engine.connect() as conn:
+    print(cache.execute(conn, other).all())
+
+    # the same is true for values passed at execution time
+    from sqlalchemy import bindparam
+
+    by_name = select(user_table).where(
+        user_table.c.username == bindparam("name")
+    )
+    print(cache.execute(conn, by_name, {"name": "patrick"}).all())
+    print(cache.execute(conn, by_name, {"name": "patrick"}).all())
+
+cache.hits, cache.misses
+
+### slide:: p
+# an UPDATE against user_account invalidates every entry that SELECTs from
+# it, so the next execution goes back to the database.
+
+with engine.begin() as conn:
+    conn.execute(
+        user_table.update()
+        .where(user_table.c.username == "spongebob")
+        .values(fullname="Spongebob Jones")
+    )
+
+with engine.connect() as conn:
+    print(cache.execute(conn, stmt).all())
+
+cache.hits, cache.misses
+
+### slide::
+### title:: ORM results
+# set up a mapping against the same table.
+
+from sqlalchemy.orm import registry
+
+
+class User:
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+mapper_registry = registry()
+mapper_registry.map_imperatively(User, user_table)
+
+### slide:: p
+# the cached objects are merged into each new Session.  The second
+# Session gets its own User object, without a SELECT.
+
+orm_stmt = select(User).where(User.username == "sandy")
+
+with Session(engine) as session:
+    sandy = cache.execute(session, orm_stmt).scalar_one()
+    print(sandy)
+
+with Session(engine) as session:
+    also_sandy = cache.execute(session, orm_stmt).scalar_one()
+    print(also_sandy, also_sandy is sandy, also_sandy in session)
+
+### slide:: p
+# flushing a change to a User invalidates the entry as well.
+
+with Session(engine) as session:
+    sandy = cache.execute(session, orm_stmt).scalar_one()
+    sandy.fullname = "Sandy Cheeks, PhD"
+    session.commit()
+
+with Session(engine) as session:
+    print(cache.execute(session, orm_stmt).scalar_one().fullname)
+
+### slide:: p
+### title:: File backend
+# the SQLite backend works the same way; the FrozenResult round trips
+# through pickle.
+
+import os
+
+if os.path.exists("result_cache.db"):
+    os.remove("result_cache.db")
+
+file_cache = ResultCache(SQLiteBackend("result_cache.db", ttl=300))
+file_cache.listen(engine)
+
+with engine.connect() as conn:
+    print(file_cache.execute(conn, stmt).all())
+    print(file_cache.execute(conn, stmt).all())
+
+file_cache.hits, file_cache.misses
+
+### slide:: p
+### title:: How much does it save?
+# run the same handful of lookups many times, directly and through each
+# cache.  Against an in-memory SQLite database doing a primary key lookup,
+# the file backend's pickling costs about as much as the query itself; it
+# pays off when the database is across a network or the query is
+# expensive.
+
+import random
+
+names = ["spongebob", "sandy", "patrick"] + [f"user{i}" for i in range(50)]
+lookups = [random.choice(names) for _ in range(20000)]
+
+
+def timed(label, execute):
+    now = time.perf_counter()
+    with engine.connect() as conn:
+        for name in lookups:
+            execute(conn, by_name, {"name": name}).all()
+    elapsed = time.perf_counter() - now
+    print(
+        f"{label:<16} {len(lookups) / elapsed:10.0f} lookups/sec"
+    )
+
+
+timed("no cache", lambda conn, stmt, params: conn.execute(stmt, params))
+timed("memory LRU", ResultCache(MemoryBackend()).execute)
+timed("sqlite file", ResultCache(SQLiteBackend("result_cache.db")).execute)
+
+### slide::
+### title:: Questions?
+
+### slide::
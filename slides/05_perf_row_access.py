@@ -0,0 +1,199 @@
+### slide::
+### title:: Row Access Patterns
+# In the "Engine Basics" section we saw that a row can be used like a
+# named tuple, by index or attribute, or as a dictionary via ._mapping,
+# and that the usual way is tuple assignment in a for loop.  Here we
+# time each style over a million rows, to see what each one costs.
+
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy import Integer, String
+
+metadata = MetaData()
+employee_table = Table(
+    "employee",
+    metadata,
+    Column("emp_id", Integer, primary_key=True),
+    Column("emp_name", String(30)),
+    Column("dep_id", Integer),
+)
+
+### slide:: p
+# new SQLite database.  NUM_ROWS can be lowered if the benchmarks below
+# take too long.
+
+from sqlalchemy import create_engine
+
+NUM_ROWS = 1000000
+
+engine = create_engine("sqlite://", future=True)
+with engine.begin() as conn:
+    metadata.create_all(conn)
+    conn.execute(
+        employee_table.insert(),
+        [
+            {"emp_id": i, "emp_name": f"employee {i}", "dep_id": i % 20}
+            for i in range(NUM_ROWS)
+        ],
+    )
+
+### slide::
+# each style is written as a function that receives a Connection and
+# reads emp_name from every row.  timed() reports the best of a few runs,
+# both in total and per row.
+
+import time
+
+from sqlalchemy import select
+
+stmt = select(employee_table)
+
+
+def timed(label, fn, repeat=3):
+    best = None
+    with engine.connect() as conn:
+        for _ in range(repeat):
+            now = time.perf_counter()
+            fn(conn)
+            elapsed = time.perf_counter() - now
+            best = elapsed if best is None else min(best, elapsed)
+    print(
+        f"{label:<24} {best * 1000:9.2f} ms "
+        f"{best / NUM_ROWS * 10 ** 9:7.0f} ns/row"
+    )
+    return best
+
+
+### slide::
+### title:: The styles being compared
+# the ways a Row can be used, as in the "Engine Basics" section
+
+
+def by_index(conn):
+    for row in conn.execute(stmt):
+        row[1]
+
+
+def by_attribute(conn):
+    for row in conn.execute(stmt):
+        row.emp_name
+
+
+def by_mapping(conn):
+    for row in conn.execute(stmt):
+        row._mapping["emp_name"]
+
+
+def by_mapping_column(conn):
+    # ._mapping is also keyed on the Column object itself
+    emp_name = employee_table.c.emp_name
+    for row in conn.execute(stmt):
+        row._mapping[emp_name]
+
+
+def unpacking(conn):
+    for emp_id, emp_name, dep_id in conn.execute(stmt):
+        emp_name
+
+
+### slide::
+# .columns() narrows each row down to the columns named, .scalars()
+# delivers the first (or the named) column of each row without a Row
+# object at all.  Both apply to the Result, not the statement, so the
+# SELECT still returns all three columns.
+
+
+def by_columns(conn):
+    for (emp_name,) in conn.execute(stmt).columns("emp_name"):
+        emp_name
+
+
+def by_scalars(conn):
+    for emp_name in conn.execute(stmt).scalars("emp_name"):
+        emp_name
+
+
+def selecting_one_column(conn):
+    # for comparison, only SELECT the column we want
+    for emp_name in conn.execute(
+        select(employee_table.c.emp_name)
+    ).scalars():
+        emp_name
+
+
+### slide::
+# the fast paths.  SQLAlchemy 2.0 adds Result.tuples(), but that only
+# changes how the rows are typed; they're still Row objects.  The real
+# floor is the DBAPI cursor itself, which returns plain tuples and skips
+# SQLAlchemy's result handling entirely, including the result processors
+# that convert values from the driver.  exec_driver_sql() gets us a raw
+# statement without that, and all() fetches every row in one call
+# rather than one at a time.
+
+
+def all_rows(conn):
+    for row in conn.execute(stmt).all():
+        row[1]
+
+
+sql = str(stmt.compile(engine))
+
+
+def driver_sql(conn):
+    for row in conn.exec_driver_sql(sql):
+        row[1]
+
+
+def dbapi_cursor(conn):
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(sql)
+        for row in cursor:
+            row[1]
+    finally:
+        cursor.close()
+
+
+def dbapi_unpacking(conn):
+    cursor = conn.connection.cursor()
+    try:
+        cursor.execute(sql)
+        for emp_id, emp_name, dep_id in cursor:
+            emp_name
+    finally:
+        cursor.close()
+
+
+### slide:: p
+### title:: Results
+# every style includes the time the database takes to produce the rows;
+# the DBAPI cursor at the bottom shows what that is by itself.
+
+results = {}
+for label, fn in [
+    ("row[1]", by_index),
+    ("row.emp_name", by_attribute),
+    ('row._mapping["emp_name"]', by_mapping),
+    ("row._mapping[column]", by_mapping_column),
+    ("tuple unpacking", unpacking),
+    ('.columns("emp_name")', by_columns),
+    ('.scalars("emp_name")', by_scalars),
+    ("select one column", selecting_one_column),
+    (".all(), then row[1]", all_rows),
+    ("exec_driver_sql()", driver_sql),
+    ("DBAPI cursor", dbapi_cursor),
+    ("DBAPI cursor, unpacking", dbapi_unpacking),
+]:
+    results[label] = timed(label, fn)
+
+### slide:: p
+# the same, less the fastest DBAPI cursor time; this is the cost of each
+# style on top of the driver, per row.
+
+floor = min(results.values())
+for label, elapsed in results.items():
+    print(f"{label:<24} {(elapsed - floor) / NUM_ROWS * 10 ** 9:7.0f} ns/row")
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,260 @@
+### slide::
+### title:: Result Type Processing
+# In the "Metadata" section, fancy_table used DateTime, Numeric and Enum.
+# SQLite has none of these natively; it stores strings and floating
+# point numbers, and SQLAlchemy converts each value as rows are fetched.
+# Here we see how much of the fetch time goes to that, column by column,
+# and what faster representations save.
+
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy import String, Numeric, DateTime, Enum
+
+metadata = MetaData()
+
+fancy_table = Table(
+    "fancy",
+    metadata,
+    Column("key", String(50), primary_key=True),
+    Column("timestamp", DateTime),
+    Column("amount", Numeric(10, 2)),
+    Column("type", Enum("a", "b", "c")),
+)
+
+### slide:: p
+# new SQLite database with lots of rows.  Some timestamps and amounts are
+# NULL.  Numeric on SQLite warns that it's converting from floating
+# point; that's one of the costs we're looking at, so it's silenced.
+
+import datetime
+import decimal
+import random
+import warnings
+
+from sqlalchemy import create_engine
+from sqlalchemy import exc
+
+warnings.filterwarnings(
+    "ignore",
+    message=r"Dialect \S+ does \*not\* support Decimal objects natively",
+    category=exc.SAWarning,
+)
+
+NUM_ROWS = 500000
+
+engine = create_engine("sqlite://", future=True)
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+random.seed(3)
+start = datetime.datetime(2021, 1, 1)
+with engine.begin() as conn:
+    conn.execute(
+        fancy_table.insert(),
+        [
+            {
+                "key": f"key{i:07d}",
+                "timestamp": start + datetime.timedelta(seconds=i * 37)
+                if i % 50
+                else None,
+                "amount": decimal.Decimal(random.randint(0, 10 ** 6)) / 100
+                if i % 70
+                else None,
+                "type": random.choice("abc"),
+            }
+            for i in range(NUM_ROWS)
+        ],
+    )
+
+### slide:: i
+# what the driver hands back, and what we get from SQLAlchemy, for the
+# second row (the first has NULLs)
+
+from sqlalchemy import select
+
+stmt = select(fancy_table).order_by(fancy_table.c.key)
+second_row = fancy_table.c.key == "key0000001"
+second = stmt.where(second_row)
+
+
+def driver_sql(stmt):
+    # the SQL string with parameters rendered inline, to run directly
+    return str(stmt.compile(engine, compile_kwargs={"literal_binds": True}))
+
+
+with engine.connect() as conn:
+    print(conn.exec_driver_sql(driver_sql(second)).fetchone())
+    print(conn.execute(second).first())
+
+### slide::
+### title:: Where the time goes
+# the result processors for a statement are the functions SQLAlchemy
+# calls on each value of a column, or None where the driver's value is
+# used as is.  processors() gets them from the result itself, so they're
+# exactly the ones the engine uses.
+
+import time
+
+
+def processors(conn, stmt):
+    result = conn.execute(stmt.limit(0))
+    procs = list(zip(result.keys(), result._metadata._processors))
+    result.close()
+    return procs
+
+
+def best_of(fn, repeat=3):
+    best = None
+    for _ in range(repeat):
+        now = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - now
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+with engine.connect() as conn:
+    for name, proc in processors(conn, stmt):
+        print(f"{name:<12} {proc}")
+
+### slide::
+# profile() fetches the rows twice: once through SQLAlchemy, once as
+# the driver's tuples.  It then runs each column's processor over that
+# column's raw values by itself, which attributes the difference between
+# the two fetches to each column.  What's left over is the cost of
+# building Row objects, the same for every type.
+
+
+def profile(stmt):
+    with engine.connect() as conn:
+        total = best_of(lambda: conn.execute(stmt).all())
+        sql = driver_sql(stmt)
+        raw = best_of(lambda: conn.exec_driver_sql(sql).cursor.fetchall())
+        rows = conn.exec_driver_sql(sql).cursor.fetchall()
+        procs = processors(conn, stmt)
+
+    print(f"{'fetch, SQLAlchemy':<24} {total:9.2f} ms")
+    print(f"{'fetch, driver only':<24} {raw:9.2f} ms")
+    processing = 0
+    for (name, proc), values in zip(procs, zip(*rows)):
+        if proc is None:
+            continue
+        elapsed = best_of(lambda: [proc(value) for value in values])
+        processing += elapsed
+        print(
+            f"  {name:<22} {elapsed:9.2f} ms  "
+            f"{elapsed / total * 100:5.1f}% of fetch"
+        )
+    other = total - raw - processing
+    print(
+        f"  {'rows, other':<22} {other:9.2f} ms  "
+        f"{other / total * 100:5.1f}% of fetch"
+    )
+
+
+### slide:: p
+# the timestamp is parsed from a string into a datetime, the amount is
+# converted from a float into a Decimal, and the Enum looks each string
+# up in its list of values.
+
+profile(stmt)
+
+### slide::
+### title:: Faster representations
+# fast_columns() is an opt-in replacement for the columns of a select()
+# which leaves the conversion out, or moves it into SQL:
+#
+# * Numeric is fetched as the float SQLite stores, via type_coerce(),
+#   which doesn't change the SQL but gives the column a type without a
+#   result processor.  Floats aren't exact; fine for charting, not
+#   for money.
+# * DateTime is turned into integer seconds since the epoch by SQLite
+#   itself.  Fractional seconds are dropped.
+# * Enum is fetched as the plain string that's stored.
+#
+# Each keeps its name, so rows are used the same way.
+
+from sqlalchemy import Float, Integer
+from sqlalchemy import cast, func, type_coerce
+
+
+def fast_columns(columns, epoch=True):
+    fast = []
+    for col in columns:
+        if isinstance(col.type, DateTime):
+            if epoch:
+                col = cast(func.strftime("%s", col), Integer).label(col.name)
+            else:
+                col = type_coerce(col, String).label(col.name)
+        elif isinstance(col.type, Enum):
+            col = type_coerce(col, String).label(col.name)
+        elif isinstance(col.type, Numeric) and not isinstance(col.type, Float):
+            col = type_coerce(col, Float).label(col.name)
+        fast.append(col)
+    return fast
+
+
+def fast(stmt, epoch=True):
+    return stmt.with_only_columns(
+        *fast_columns(stmt.selected_columns, epoch=epoch)
+    )
+
+
+fast_stmt = fast(stmt)
+storage_stmt = fast(stmt, epoch=False)
+
+### slide:: i
+# the SQL, and the rows, for each mode
+
+print(fast_stmt)
+with engine.connect() as conn:
+    print(conn.execute(second).first())
+    print(conn.execute(fast_stmt.where(second_row)).first())
+    print(conn.execute(storage_stmt.where(second_row)).first())
+
+### slide:: p
+# the epoch integers convert back to the same datetime, for the rows
+# that need it
+
+with engine.connect() as conn:
+    row = conn.execute(fast_stmt.where(second_row)).first()
+    stored = conn.execute(second).first().timestamp
+
+# the stored values are naive UTC, so drop the tzinfo after converting
+converted = datetime.datetime.fromtimestamp(
+    row.timestamp, datetime.timezone.utc
+).replace(tzinfo=None)
+print(converted, converted == stored)
+
+### slide:: p
+### title:: Results
+# all three fetch the same rows.  With the storage types nothing is left
+# to do per value; the epoch form moves the date parsing into SQLite's
+# strftime(), which is worth comparing with the C parser SQLAlchemy uses.
+
+for label, s in [
+    ("DateTime, Numeric, Enum", stmt),
+    ("epoch, float, string", fast_stmt),
+    ("string, float, string", storage_stmt),
+]:
+    print(f"--- {label}")
+    profile(s)
+
+### slide:: p
+# per-column, against the full types: only the columns being converted
+# are changed here, one at a time.
+
+for name in ("timestamp", "amount", "type"):
+    columns = [
+        fast_columns([col])[0] if col.name == name else col
+        for col in stmt.selected_columns
+    ]
+    with engine.connect() as conn:
+        elapsed = best_of(
+            lambda: conn.execute(stmt.with_only_columns(*columns)).all()
+        )
+    print(f"fast {name:<12} {elapsed:9.2f} ms")
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,381 @@
+### slide::
+### title:: Autoflush
+# In the "ORM" section we saw that session.execute() first flushes any
+# pending changes, so that the query sees them.  An import loop that
+# adds an object, then runs a query, then adds another, flushes once per
+# object; here we count those flushes and time them, then try a Session
+# that only flushes when the query involves a table with pending changes.
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import registry
+from sqlalchemy.orm import relationship
+
+mapper_registry = registry()
+
+
+@mapper_registry.mapped
+class User:
+    __tablename__ = "user_account"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String, unique=True)
+    fullname = Column(String)
+
+    addresses = relationship("Address", back_populates="user")
+
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+@mapper_registry.mapped
+class Address:
+    __tablename__ = "email_address"
+
+    id = Column(Integer, primary_key=True)
+    email_address = Column(String, nullable=False)
+    user_id = Column(ForeignKey("user_account.id"), nullable=False)
+
+    user = relationship("User", back_populates="addresses")
+
+    def __repr__(self):
+        return "<Address(%r)>" % self.email_address
+
+
+### slide::
+### title:: Counting autoflushes
+# Session._autoflush() is what session.execute(), Session.get() and lazy
+# loads call before they run a query.  AutoflushSession wraps it to
+# count each autoflush, and times them, keeping those with nothing to
+# flush apart as no-ops.
+
+import time
+
+from sqlalchemy.orm import Session
+
+
+class AutoflushStats:
+    def __init__(self):
+        self.flushes = []
+        self.noops = []
+        self.deferred = 0
+
+    def report(self):
+        total = sum(self.flushes) + sum(self.noops)
+        count = len(self.flushes) + len(self.noops)
+        print(
+            f"{count} autoflushes, {len(self.noops)} no-ops, "
+            f"{self.deferred} deferred, {total * 1000:.2f} ms"
+        )
+        for label, times in [("flush", self.flushes), ("no-op", self.noops)]:
+            if times:
+                print(
+                    f"    {label}: {len(times)}, mean "
+                    f"{sum(times) / len(times) * 10 ** 6:.1f} us, "
+                    f"max {max(times) * 1000:.2f} ms"
+                )
+
+
+class AutoflushSession(Session):
+    def __init__(self, *arg, defer_autoflush=False, **kw):
+        super().__init__(*arg, **kw)
+        self.defer_autoflush = defer_autoflush
+        self.autoflush_stats = AutoflushStats()
+        self._pending_tables = set()
+        self._statement = None
+
+    def execute(self, statement, *arg, **kw):
+        # note the statement, for _autoflush() to look at
+        outer, self._statement = self._statement, statement
+        try:
+            return super().execute(statement, *arg, **kw)
+        finally:
+            self._statement = outer
+
+    def _autoflush(self):
+        if not self.autoflush or self._flushing:
+            return super()._autoflush()
+
+        stats = self.autoflush_stats
+        noop = self._is_clean()
+        if (
+            not noop
+            and self.defer_autoflush
+            and not self._touches_pending(self._statement)
+        ):
+            stats.deferred += 1
+            return
+
+        now = time.perf_counter()
+        super()._autoflush()
+        elapsed = time.perf_counter() - now
+        (stats.noops if noop else stats.flushes).append(elapsed)
+
+    def _touches_pending(self, statement):
+        tables = statement_tables(statement)
+        if tables is None:
+            return True
+        pending = set(self._pending_tables)
+        for state in self._deleted:
+            pending.update(_deleted_tables(state.mapper))
+        for state in self._dirty_states:
+            pending.update(_modified_tables(state))
+        return not tables.isdisjoint(pending)
+
+
+### slide::
+### title:: Deferring unrelated autoflushes
+# with defer_autoflush=True, the Session skips an autoflush when the
+# query can't see any of the pending changes: no table the query refers
+# to is one that the flush would write to.  The changes stay pending
+# until a query that does need them, or the commit.
+#
+# statement_tables() finds the tables a SELECT refers to, including
+# those of relationship joins and joined eager loads.  For anything else
+# - a statement with loader options, text(), an ORM UPDATE - it returns
+# None, and the Session flushes as usual.
+
+from sqlalchemy import Table
+from sqlalchemy import inspect
+from sqlalchemy.orm import interfaces
+from sqlalchemy.orm.relationships import RelationshipProperty
+from sqlalchemy.sql import visitors
+from sqlalchemy.sql.selectable import Select
+
+
+def statement_tables(statement):
+    # lazy loads run "lambda" statements; use the SELECT inside
+    statement = getattr(statement, "_resolved", statement)
+    if not isinstance(statement, Select) or statement._with_options:
+        return None
+
+    tables = {
+        element
+        for element in visitors.iterate(statement)
+        if isinstance(element, Table)
+    }
+
+    relationships = [
+        item.property
+        for join in statement._setup_joins + statement._legacy_setup_joins
+        for item in join[0:3]
+        if isinstance(getattr(item, "property", None), RelationshipProperty)
+    ]
+    for description in statement.column_descriptions:
+        if description["entity"] is not None:
+            mapper = inspect(description["entity"]).mapper
+            tables.update(mapper.tables)
+            relationships.extend(_joined_eager(mapper))
+
+    seen = set()
+    while relationships:
+        prop = relationships.pop()
+        if prop in seen:
+            continue
+        seen.add(prop)
+        tables.update(prop.mapper.tables)
+        if prop.secondary is not None:
+            tables.add(prop.secondary)
+        relationships.extend(_joined_eager(prop.mapper))
+    return tables
+
+
+def _joined_eager(mapper):
+    return [prop for prop in mapper.relationships if prop.lazy == "joined"]
+
+
+### slide::
+# the tables a flush writes to.  A new object is INSERTed into its
+# mapper's tables, along with rows of any many-to-many tables.  For a
+# modified object, only what was changed counts: its columns, and for a
+# relationship, the table that has the foreign key.  Adding an Address
+# to a User's collection changes email_address, not user_account.
+
+
+def _new_tables(mapper):
+    tables = set(mapper.tables)
+    for prop in mapper.relationships:
+        if prop.secondary is not None:
+            tables.add(prop.secondary)
+    return tables
+
+
+def _deleted_tables(mapper):
+    # related rows may have their foreign keys set to NULL, or be deleted
+    tables = _new_tables(mapper)
+    for prop in mapper.relationships:
+        tables.update(prop.mapper.tables)
+    return tables
+
+
+def _modified_tables(state):
+    tables = set()
+    for key in state.committed_state:
+        prop = state.mapper.attrs[key]
+        if not isinstance(prop, RelationshipProperty):
+            tables.update(col.table for col in prop.columns)
+        elif prop.direction is interfaces.ONETOMANY:
+            tables.update(prop.mapper.tables)
+        elif prop.direction is interfaces.MANYTOONE:
+            tables.add(prop.parent.local_table)
+        else:
+            tables.add(prop.secondary)
+    return tables
+
+
+### slide::
+# new objects are noted as they're added, rather than looked at for each
+# query, as an importer may have thousands of them pending.  After each
+# flush they're persistent, and there's nothing pending again.
+
+from sqlalchemy import event
+
+
+@event.listens_for(AutoflushSession, "transient_to_pending")
+def _note_pending(session, instance):
+    session._pending_tables.update(_new_tables(inspect(instance).mapper))
+
+
+@event.listens_for(AutoflushSession, "after_flush_postexec")
+def _forget_pending(session, flush_context):
+    session._pending_tables = _new_tables_of(session)
+
+
+@event.listens_for(AutoflushSession, "after_rollback")
+def _forget_rolled_back(session):
+    session._pending_tables = _new_tables_of(session)
+
+
+def _new_tables_of(session):
+    # empty, unless a flush has left objects pending
+    tables = set()
+    for state in session._new:
+        tables.update(_new_tables(state.mapper))
+    return tables
+
+
+### slide:: p
+# a database with some users, and statement counting
+
+import collections
+
+from sqlalchemy import create_engine
+
+NUM_USERS = 100
+
+engine = create_engine("sqlite://")
+with engine.begin() as connection:
+    mapper_registry.metadata.create_all(connection)
+    connection.execute(
+        User.__table__.insert(),
+        [
+            {"username": f"user{i}", "fullname": f"User {i}"}
+            for i in range(NUM_USERS)
+        ],
+    )
+
+statements = collections.Counter()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements[statement.split()[0]] += 1
+
+
+### slide:: p
+### title:: What gets flushed, and when
+# looking up a user doesn't need the new address to be flushed; looking
+# up addresses does.
+
+from sqlalchemy import select
+
+session = AutoflushSession(engine, future=True, defer_autoflush=True)
+
+spongebob = session.execute(
+    select(User).filter_by(username="user1")
+).scalar_one()
+session.add(Address(user=spongebob, email_address="spongebob@gmail.com"))
+
+session.execute(select(User).filter_by(username="user2")).scalar_one()
+session.execute(
+    select(Address).filter_by(email_address="spongebob@gmail.com")
+).scalar_one()
+session.autoflush_stats.report()
+
+### slide:: p
+# the same for a join to the table, or a collection load.  A change to
+# a User's own columns makes queries of user_account flush.
+
+session.add(Address(user=spongebob, email_address="spongebob@yahoo.com"))
+session.execute(
+    select(User).join(User.addresses).filter(User.username == "user2")
+).all()
+
+session.add(Address(user=spongebob, email_address="spongebob@aol.com"))
+session.get(User, 3).addresses
+
+spongebob.fullname = "Spongebob Squarepants"
+session.execute(select(User).filter_by(username="user2")).scalar_one()
+session.autoflush_stats.report()
+
+### slide:: p
+session.rollback()
+session.close()
+
+### slide::
+### title:: An import loop
+# import_addresses() is the shape of our importers: for each row it
+# looks up the User it belongs to, then adds an Address.  Every hundred
+# rows it checks that an address isn't already there, which has to see
+# the pending ones.  Turn SQL echo off with the "echo" command before
+# running these.
+
+NUM_ROWS = 5000
+
+rows = [
+    (f"user{num % NUM_USERS}", f"address{num}@example.com")
+    for num in range(NUM_ROWS)
+]
+
+
+def import_addresses(session, rows, check_every=100):
+    for num, (username, email_address) in enumerate(rows):
+        user = session.execute(
+            select(User).filter_by(username=username)
+        ).scalar_one()
+        if num % check_every == 0:
+            session.execute(
+                select(Address.id).filter_by(email_address=email_address)
+            ).first()
+        session.add(Address(user=user, email_address=email_address))
+    session.commit()
+
+
+def run(label, **kw):
+    with engine.begin() as connection:
+        connection.execute(Address.__table__.delete())
+    statements.clear()
+    with AutoflushSession(engine, future=True, **kw) as session:
+        now = time.perf_counter()
+        import_addresses(session, rows)
+        elapsed = time.perf_counter() - now
+    print(f"--- {label}: {elapsed * 1000:.2f} ms, {dict(statements)}")
+    session.autoflush_stats.report()
+
+
+### slide:: p
+### title:: Results
+# deferring leaves one flush per hundred rows, each writing a hundred
+# addresses.  What remains between it and autoflush=False is mostly
+# statement_tables() looking through each statement.  autoflush=False
+# isn't correct here, only fast: the check every hundred rows queries
+# email_address without the pending addresses flushed, so it gives
+# wrong answers, and would miss a duplicate among them.
+
+run("autoflush")
+run("deferred autoflush", defer_autoflush=True)
+run("no autoflush", autoflush=False)
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,253 @@
+### slide::
+### title:: Very Large Collections
+# In the "Relationships" section, User.addresses was loaded in full the
+# first time it was used, and moving an Address to another User updated
+# both users' lists.  That's fine for a few addresses and not for a
+# hundred thousand.  A "dynamic" relationship is never loaded as a whole;
+# it's a Query that also accepts appends and removes, which are applied
+# at flush time without loading anything.
+#
+# mapping() builds the same User / Address mapping with a given kind of
+# collection, in its own registry, so that we can compare the two.
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import registry
+from sqlalchemy.orm import relationship
+
+
+def mapping(lazy):
+    mapper_registry = registry()
+
+    @mapper_registry.mapped
+    class User:
+        __tablename__ = "user_account"
+
+        id = Column(Integer, primary_key=True)
+        username = Column(String)
+        fullname = Column(String)
+
+        # an Address removed from the collection is deleted
+        addresses = relationship(
+            "Address",
+            back_populates="user",
+            lazy=lazy,
+            cascade="all, delete-orphan",
+        )
+
+        def __repr__(self):
+            return "<User(%r, %r)>" % (self.username, self.fullname)
+
+    @mapper_registry.mapped
+    class Address:
+        __tablename__ = "email_address"
+
+        id = Column(Integer, primary_key=True)
+        email_address = Column(String, nullable=False)
+        user_id = Column(ForeignKey("user_account.id"), nullable=False)
+
+        user = relationship("User", back_populates="addresses")
+
+        def __repr__(self):
+            return "<Address(%r)>" % self.email_address
+
+    return mapper_registry, User, Address
+
+
+### slide::
+# database() makes a new SQLite database for a mapping, with two users
+# that have NUM_ADDRESSES addresses each, inserted with Core.  The
+# statements run against each engine are counted.
+
+import collections
+
+from sqlalchemy import create_engine
+from sqlalchemy import event
+
+NUM_ADDRESSES = 100000
+
+statements = collections.Counter()
+
+
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements[statement.split()[0]] += 1
+
+
+def database(mapper_registry, User, Address):
+    engine = create_engine("sqlite://")
+    with engine.begin() as connection:
+        mapper_registry.metadata.create_all(connection)
+        connection.execute(
+            User.__table__.insert(),
+            [
+                {
+                    "id": 1,
+                    "username": "spongebob",
+                    "fullname": "Spongebob Squarepants",
+                },
+                {
+                    "id": 2,
+                    "username": "squidward",
+                    "fullname": "Squidward Tentacles",
+                },
+            ],
+        )
+        connection.execute(
+            Address.__table__.insert(),
+            [
+                {"user_id": user_id, "email_address": f"{name}{i}@example.com"}
+                for user_id, name in [(1, "sb"), (2, "sq")]
+                for i in range(NUM_ADDRESSES)
+            ],
+        )
+    event.listen(engine, "before_cursor_execute", _count)
+    return engine
+
+
+### slide:: p
+# the dynamic mapping and its database
+
+mapper_registry, User, Address = mapping("dynamic")
+engine = database(mapper_registry, User, Address)
+
+from sqlalchemy.orm import Session
+
+session = Session(engine, future=True)
+spongebob = session.get(User, 1)
+squidward = session.get(User, 2)
+
+### slide:: i
+# User.addresses is now a query against this user's addresses
+
+spongebob.addresses
+
+### slide:: p
+# so we use it like one.  Nothing is kept in memory; each use runs
+# another SELECT.
+
+spongebob.addresses.count()
+spongebob.addresses.filter(Address.email_address.like("%99999%")).all()
+spongebob.addresses.order_by(Address.id.desc())[0:3]
+
+### slide:: p
+### title:: Appending, moving, removing
+# appending a new Address emits only the INSERT, at flush time
+
+spongebob.addresses.append(Address(email_address="spongebob@gmail.com"))
+session.flush()
+
+### slide:: p
+# moving an Address from one user to another, from either side, emits
+# only the UPDATE of that address.  Neither collection is loaded.
+
+address = squidward.addresses.first()
+address.user = spongebob
+session.flush()
+
+address = squidward.addresses.first()
+spongebob.addresses.append(address)
+session.flush()
+
+### slide:: p
+# removing an Address from the collection makes it an orphan, which the
+# cascade deletes
+
+address = squidward.addresses.first()
+squidward.addresses.remove(address)
+session.flush()
+
+### slide:: p
+session.commit()
+session.close()
+
+### slide::
+### title:: How much does it save?
+# each operation runs in its own Session, is committed, and is measured
+# by peak memory allocated, using tracemalloc, and by the statements
+# emitted.  Turn SQL echo off with the "echo" command before running
+# these.
+
+import time
+import tracemalloc
+
+
+def measure(label, engine, User, Address, operation):
+    statements.clear()
+    tracemalloc.start()
+    now = time.perf_counter()
+    with Session(engine, future=True) as session:
+        operation(session, User, Address)
+        session.commit()
+    elapsed = time.perf_counter() - now
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    counts = ", ".join(
+        f"{count} {keyword}" for keyword, count in sorted(statements.items())
+    )
+    print(
+        f"{label:<36} {peak / 2 ** 20:8.1f} MiB "
+        f"{elapsed * 1000:9.2f} ms  {counts}"
+    )
+
+
+### slide::
+# the operations.  Each one changes the database, so they work on
+# different addresses every time they're run; session.get() of an
+# Address is a SELECT of one row.  The User is kept in a variable, as
+# the Session only holds weak references to unchanged objects.
+
+import itertools
+
+address_ids = itertools.count(1)
+
+
+def append(session, User, Address):
+    user = session.get(User, 1)
+    user.addresses.append(Address(email_address="new@example.com"))
+
+
+def move_by_attribute(session, User, Address):
+    user = session.get(User, 2)
+    session.get(Address, next(address_ids)).user = user
+
+
+def move_by_collection(session, User, Address):
+    user = session.get(User, 2)
+    user.addresses.append(session.get(Address, next(address_ids)))
+
+
+def remove(session, User, Address):
+    user = session.get(User, 1)
+    user.addresses.remove(session.get(Address, next(address_ids)))
+
+
+def count(session, User, Address):
+    addresses = session.get(User, 1).addresses
+    if isinstance(addresses, list):
+        len(addresses)
+    else:
+        addresses.count()
+
+
+### slide:: p
+### title:: Results
+# the same operations with the default list collection and with the
+# dynamic one.  With the list, everything that touches the collection
+# loads it in full first; assigning Address.user only avoids that as
+# long as neither user's collection has been loaded yet.
+
+for lazy in ("select", "dynamic"):
+    mapped = mapping(lazy)
+    lazy_engine = database(*mapped)
+    for label, operation in [
+        ("append", append),
+        ("move, address.user = user", move_by_attribute),
+        ("move, addresses.append()", move_by_collection),
+        ("remove", remove),
+        ("count", count),
+    ]:
+        measure(f"{lazy}: {label}", lazy_engine, *mapped[1:], operation)
+
+### slide::
+### title:: Questions?
+
+### slide::
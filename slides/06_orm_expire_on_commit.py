@@ -0,0 +1,231 @@
+### slide::
+### title:: Expiration on Commit
+# In the "ORM" section we saw that after session.commit(), every object
+# in the Session is expired, and the next access of spongebob.fullname
+# loads the row again.  In a loop that commits often while holding on to
+# many objects, those loads add up.  Here we count them, object by
+# object, and try Sessions that expire less.
+
+from sqlalchemy import Column, Integer, String
+from sqlalchemy.orm import registry
+
+mapper_registry = registry()
+
+
+@mapper_registry.mapped
+class User:
+    __tablename__ = "user_account"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String)
+    fullname = Column(String)
+    logins = Column(Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+### slide:: p
+# a database with some users
+
+from sqlalchemy import create_engine
+
+NUM_USERS = 200
+
+engine = create_engine("sqlite://")
+with engine.begin() as connection:
+    mapper_registry.metadata.create_all(connection)
+    connection.execute(
+        User.__table__.insert(),
+        [
+            {"username": f"user{i}", "fullname": f"User {i}", "logins": 0}
+            for i in range(NUM_USERS)
+        ],
+    )
+
+### slide::
+### title:: Counting refreshes
+# the "refresh" event fires each time an object that's already loaded
+# has attributes loaded again, which is what happens when an expired
+# attribute is accessed.  RefreshCounter counts them for each object,
+# along with the SELECT statements run in all.
+
+import collections
+
+from sqlalchemy import event
+from sqlalchemy import inspect
+
+
+class RefreshCounter:
+    def __init__(self, engine, *classes):
+        self.refreshes = collections.Counter()
+        self.selects = 0
+        for cls in classes:
+            event.listen(cls, "refresh", self._on_refresh)
+        event.listen(engine, "before_cursor_execute", self._on_execute)
+
+    def clear(self):
+        self.refreshes.clear()
+        self.selects = 0
+
+    def _on_refresh(self, target, context, attrs):
+        self.refreshes[inspect(target).identity_key] += 1
+
+    def _on_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        if statement.lstrip().upper().startswith("SELECT"):
+            self.selects += 1
+
+    def report(self, top=3):
+        print(
+            f"{self.selects} SELECTs, {sum(self.refreshes.values())} "
+            f"refreshes of {len(self.refreshes)} objects"
+        )
+        for (cls, ident, _), count in self.refreshes.most_common(top):
+            print(f"    {cls.__name__}{ident}: {count}")
+
+
+counter = RefreshCounter(engine, User)
+
+### slide:: p
+# the example from the "ORM" section, with every user loaded.  After the
+# commit, reading each user's fullname loads that user again.
+
+from sqlalchemy import select
+from sqlalchemy.orm import Session
+
+session = Session(engine, future=True)
+users = session.execute(select(User)).scalars().all()
+users[0].fullname = "Spongebob Squarepants"
+session.commit()
+
+counter.clear()
+[user.fullname for user in users]
+counter.report()
+session.close()
+
+### slide::
+### title:: Expiring only what was modified
+# ExpireModifiedSession doesn't expire everything on commit.  Instead
+# it notes which attributes of which objects were flushed during the
+# transaction, and expires just those when it commits.  Attributes
+# changed by SQL expressions or server defaults are expired by the flush
+# itself, as usual.
+#
+# The trade-off: attributes we didn't change keep their values from
+# before the commit, so changes made to those rows by other
+# transactions aren't seen until the object is refreshed or the
+# Session is closed.  A rollback still expires everything.
+#
+# expire_on_commit=False, the existing option, expires nothing at all.
+
+
+class ExpireModifiedSession(Session):
+    def __init__(self, *arg, **kw):
+        kw["expire_on_commit"] = False
+        super().__init__(*arg, **kw)
+        self._flushed_attrs = collections.defaultdict(set)
+
+
+@event.listens_for(ExpireModifiedSession, "after_flush")
+def _note_flushed(session, flush_context):
+    for obj in session.dirty:
+        state = inspect(obj)
+        if state.committed_state:
+            session._flushed_attrs[state].update(state.committed_state)
+
+
+@event.listens_for(ExpireModifiedSession, "after_commit")
+def _expire_flushed(session):
+    flushed, session._flushed_attrs = (
+        session._flushed_attrs,
+        collections.defaultdict(set),
+    )
+    for state, keys in flushed.items():
+        obj = state.obj()
+        if obj is not None and state.session_id == session.hash_key:
+            session.expire(obj, keys)
+
+
+@event.listens_for(ExpireModifiedSession, "after_rollback")
+def _forget_flushed(session):
+    session._flushed_attrs.clear()
+
+
+### slide:: p
+# the same as before.  Only the fullname we changed is loaded again.
+
+session = ExpireModifiedSession(engine, future=True)
+users = session.execute(select(User)).scalars().all()
+users[0].fullname = "Spongebob Squarepants"
+session.commit()
+
+counter.clear()
+[user.fullname for user in users]
+counter.report()
+
+### slide:: p
+# a value we didn't change isn't reloaded, even if another transaction
+# changed it in the meantime
+
+with engine.begin() as connection:
+    connection.execute(
+        User.__table__.update()
+        .where(User.__table__.c.id == users[1].id)
+        .values(fullname="Changed elsewhere")
+    )
+
+users[1].fullname, session.get(User, users[1].id, populate_existing=True)
+
+### slide:: p
+session.close()
+
+### slide::
+### title:: A commit-heavy loop
+# a "request" here holds on to a set of users, updates one of them and
+# commits, then reads every user, many times over.  This is the pattern
+# of a long-running worker that commits as it goes.  Turn SQL echo off
+# with the "echo" command before running these.
+
+import time
+
+from sqlalchemy.orm import sessionmaker
+
+
+def run(label, session_factory, num_commits=200):
+    with session_factory() as session:
+        users = session.execute(select(User)).scalars().all()
+        counter.clear()
+        now = time.perf_counter()
+        for num in range(num_commits):
+            user = users[num % len(users)]
+            user.logins += 1
+            session.commit()
+            for user in users:
+                user.username, user.fullname, user.logins
+        elapsed = time.perf_counter() - now
+    print(f"--- {label}: {elapsed * 1000:.2f} ms")
+    counter.report()
+
+
+### slide:: p
+### title:: Results
+
+for label, session_factory in [
+    ("expire all (default)", sessionmaker(engine, future=True)),
+    (
+        "expire modified",
+        sessionmaker(engine, future=True, class_=ExpireModifiedSession),
+    ),
+    (
+        "expire nothing",
+        sessionmaker(engine, future=True, expire_on_commit=False),
+    ),
+]:
+    run(label, session_factory)
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,374 @@
+### slide::
+### title:: A Second Level Cache for Identities
+# The identity map is per-Session; it's discarded when the Session is
+# closed and expired on every commit.  Here we add a cache of loaded rows
+# that's shared among all Sessions, and consulted by Session.get() and by
+# many-to-one lazy loads before they emit SQL.
+#
+# Start with the User / Address mapping, adding a *version id* column to
+# each, which the ORM increments on every UPDATE.
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import registry
+from sqlalchemy.orm import relationship
+
+mapper_registry = registry()
+
+
+@mapper_registry.mapped
+class User:
+    __tablename__ = "user_account"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String)
+    fullname = Column(String)
+    version_id = Column(Integer, nullable=False)
+
+    addresses = relationship("Address", back_populates="user")
+
+    __mapper_args__ = {"version_id_col": version_id}
+
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+@mapper_registry.mapped
+class Address:
+    __tablename__ = "email_address"
+
+    id = Column(Integer, primary_key=True)
+    email_address = Column(String, nullable=False)
+    user_id = Column(ForeignKey("user_account.id"), nullable=False)
+    version_id = Column(Integer, nullable=False)
+
+    user = relationship("User", back_populates="addresses")
+
+    __mapper_args__ = {"version_id_col": version_id}
+
+    def __repr__(self):
+        return "<Address(%r)>" % self.email_address
+
+
+### slide::
+### title:: IdentityCache
+# The cache stores a plain dictionary of column values for each identity,
+# never the objects themselves, since an object belongs to one Session.
+# It's an LRU bounded at max_size entries.
+#
+# Entries are added from the "load" and "refresh" events, i.e. whenever
+# a row for a registered class is loaded by a Session that uses this
+# cache, and only if all of its column attributes are loaded.
+#
+# After a flush, entries for updated and deleted objects are to be
+# removed.  For a versioned mapping, an UPDATE also leaves behind a
+# marker with the new version id, so that a Session which loaded the old
+# row before the UPDATE committed can't put it back.  If a stale entry is
+# ever used anyway, the version id check on UPDATE will raise instead of
+# overwriting newer data.
+#
+# Nothing a transaction hasn't committed may be shared, though.  Once a
+# Session has flushed, its invalidations, and the rows it loads, which
+# may include its own changes, are kept with the Session and applied
+# when it commits; a rollback, or closing the Session, discards them.
+# Rows loaded by a Session that hasn't flushed are committed ones, and
+# are added right away.
+
+import collections
+import threading
+
+from sqlalchemy import event, inspect
+
+
+class IdentityCache:
+    def __init__(self, max_size=10000):
+        self.max_size = max_size
+        self.hits = self.misses = 0
+        self._entries = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, cls):
+        event.listen(cls, "load", self._on_load)
+        event.listen(cls, "refresh", self._on_refresh)
+
+    def get(self, mapper, primary_key_identity):
+        key = mapper.identity_key_from_primary_key(primary_key_identity)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key, version, values):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and _older(version, entry[0]):
+                return
+            self._entries[key] = (version, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key, version, deleted=False):
+        with self._lock:
+            self._entries.pop(key, None)
+            if not deleted and version is not None:
+                self._entries[key] = (version, None)
+
+    def _on_load(self, target, context):
+        self._loaded(context.session, inspect(target))
+
+    def _on_refresh(self, target, context, attrs):
+        self._loaded(context.session, inspect(target))
+
+    def _loaded(self, session, state):
+        if getattr(session, "identity_cache", None) is not self:
+            return
+        keys = [prop.key for prop in state.mapper.column_attrs]
+        if state.key is None or not all(key in state.dict for key in keys):
+            return
+        values = {key: state.dict[key] for key in keys}
+        put = (state.key, _version(state), values)
+
+        pending = session.info.get("identity_cache")
+        if pending is None:
+            self.put(*put)
+        else:
+            pending[1].append(put)
+
+
+def _version(state):
+    version_col = state.mapper.version_id_col
+    if version_col is None:
+        return None
+    prop = state.mapper.get_property_by_column(version_col)
+    return state.dict.get(prop.key)
+
+
+def _older(version, existing):
+    return version is not None and existing is not None and version < existing
+
+
+### slide::
+### title:: CachingSession
+# Session._identity_lookup() is where Session.get(), as well as lazy loads
+# of simple many-to-one relationships, look for an object in the identity
+# map before emitting a SELECT.  Our Session subclass consults the shared
+# cache when that lookup misses, and builds a new instance from the cached
+# values.  make_transient_to_detached() gives it an identity key as though
+# it had been loaded, after which it is added to the Session as an
+# ordinary persistent object.
+
+from sqlalchemy.orm import Session
+from sqlalchemy.orm import make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+
+class CachingSession(Session):
+    def __init__(self, *arg, identity_cache=None, **kw):
+        super().__init__(*arg, **kw)
+        self.identity_cache = identity_cache
+
+    def _identity_lookup(self, mapper, primary_key_identity, **kw):
+        instance = super()._identity_lookup(
+            mapper, primary_key_identity, **kw
+        )
+        if instance is not None or self.identity_cache is None:
+            return instance
+
+        values = self.identity_cache.get(mapper, primary_key_identity)
+        if values is None:
+            return None
+
+        instance = mapper.class_manager.new_instance()
+        for key, value in values.items():
+            set_committed_value(instance, key, value)
+        make_transient_to_detached(instance)
+        self.add(instance)
+        return instance
+
+
+# a Session's pending changes to the cache are kept in session.info, as
+# (invalidations, puts)
+
+
+@event.listens_for(CachingSession, "after_flush")
+def _invalidate_flushed(session, flush_context):
+    if session.identity_cache is None:
+        return
+    invalidations, puts = session.info.setdefault("identity_cache", ([], []))
+    for obj in session.dirty:
+        if session.is_modified(obj):
+            state = inspect(obj)
+            invalidations.append((state.key, _version(state), False))
+    for obj in session.deleted:
+        state = inspect(obj)
+        invalidations.append((state.key, _version(state), True))
+
+
+@event.listens_for(CachingSession, "after_commit")
+def _apply_committed(session):
+    invalidations, puts = session.info.pop("identity_cache", ((), ()))
+    for invalidation in invalidations:
+        session.identity_cache.invalidate(*invalidation)
+    for put in puts:
+        session.identity_cache.put(*put)
+
+
+@event.listens_for(CachingSession, "after_transaction_end")
+def _discard_uncommitted(session, transaction):
+    if transaction.parent is None:
+        session.info.pop("identity_cache", None)
+
+
+### slide:: p
+# create tables, count the statements emitted, and set up a sessionmaker
+# with a shared cache.
+
+from sqlalchemy import create_engine
+
+engine = create_engine("sqlite://")
+with engine.begin() as connection:
+    mapper_registry.metadata.create_all(connection)
+
+statements = collections.Counter()
+
+
+@event.listens_for(engine, "before_cursor_execute")
+def _count(conn, cursor, statement, parameters, context, executemany):
+    statements[statement.split()[0]] += 1
+
+
+identity_cache = IdentityCache(max_size=1000)
+identity_cache.register(User)
+identity_cache.register(Address)
+
+from sqlalchemy.orm import sessionmaker
+
+Session = sessionmaker(
+    bind=engine,
+    future=True,
+    class_=CachingSession,
+    identity_cache=identity_cache,
+)
+
+### slide:: p
+# some data.
+
+with Session.begin() as session:
+    session.add_all(
+        [
+            User(
+                username="spongebob",
+                fullname="Spongebob Squarepants",
+                addresses=[Address(email_address="spongebob@gmail.com")],
+            ),
+            User(
+                username="sandy",
+                fullname="Sandy Cheeks",
+                addresses=[Address(email_address="sandy@yahoo.com")],
+            ),
+        ]
+    )
+
+### slide:: p
+### title:: Session.get() across Sessions
+# the first Session loads spongebob with a SELECT.  The next Session finds
+# it in the shared cache.
+
+statements.clear()
+
+with Session() as session:
+    spongebob = session.get(User, 1)
+
+with Session() as session:
+    also_spongebob = session.get(User, 1)
+    print(also_spongebob, also_spongebob in session)
+
+statements, identity_cache.hits
+
+### slide:: p
+### title:: Many-to-one lazy loads
+# loading an Address and then accessing .user looks for the User in the
+# cache as well.
+
+statements.clear()
+
+from sqlalchemy import select
+
+with Session() as session:
+    for address in session.execute(select(Address)).scalars():
+        print(address, address.user)
+
+statements
+
+### slide:: p
+### title:: Invalidation
+# changing spongebob and committing removes the entry, leaving the new
+# version id behind.
+
+with Session() as session:
+    spongebob = session.get(User, 1)
+    spongebob.fullname = "Spongebob Jones"
+    session.commit()
+
+identity_cache._entries[inspect(User).identity_key_from_primary_key((1,))]
+
+### slide:: p
+# the next load goes to the database, and caches the new row.
+
+statements.clear()
+with Session() as session:
+    print(session.get(User, 1).fullname)
+with Session() as session:
+    print(session.get(User, 1).fullname)
+
+statements
+
+### slide:: p
+### title:: How much does it save?
+# many addresses belonging to a few users, loaded in lots of short
+# Sessions as a web application would.  Turn SQL echo off with the
+# "echo" command before running this one.
+
+import time
+
+with Session.begin() as session:
+    users = [
+        User(username=f"user{i}", fullname=f"User {i}") for i in range(23)
+    ]
+    session.add_all(users)
+    session.add_all(
+        [
+            Address(email_address=f"a{i}@example.com", user=users[i % 23])
+            for i in range(5000)
+        ]
+    )
+
+
+def run(session_factory, num_requests=500):
+    statements.clear()
+    now = time.perf_counter()
+    for request_num in range(num_requests):
+        with session_factory() as session:
+            for address in session.execute(
+                select(Address).where(Address.id % num_requests == request_num)
+            ).scalars():
+                address.user.username
+    elapsed = time.perf_counter() - now
+    print(f"{sum(statements.values()):6} statements  {elapsed * 1000:8.2f} ms")
+
+
+uncached = sessionmaker(bind=engine, future=True)
+
+### slide:: p
+
+run(uncached)
+run(Session)
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,263 @@
+### slide::
+### title:: Engines and multiprocessing
+# An Engine's connection pool holds DBAPI connections, which are sockets or
+# file handles.  When a process forks, the child inherits copies of them;
+# if both processes use the same connection, they corrupt each other's
+# conversation with the database.  Here we run an ETL job over several
+# worker processes, safely sharing one Engine across fork.
+
+from sqlalchemy import MetaData, Table, Column, ForeignKey
+from sqlalchemy import Integer, String
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+)
+
+address_table = Table(
+    "email_address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column(
+        "user_id", ForeignKey("user_account.id"), nullable=False, index=True
+    ),
+    Column("email_address", String(100), nullable=False),
+)
+
+### slide:: p
+# a SQLite file database.  We use QueuePool
+# explicitly, as a server database would, so that the parent process is
+# holding on to pooled connections at the time it forks.
+
+import os
+import random
+
+from sqlalchemy import create_engine
+from sqlalchemy.pool import QueuePool
+
+if os.path.exists("etl.db"):
+    os.remove("etl.db")
+
+engine = create_engine("sqlite:///etl.db", poolclass=QueuePool, future=True)
+
+### slide::
+# before using the Engine, we set up pool events which record the process
+# that created each connection, and refuse to hand one out in any other
+# process.  The pool then discards it and connects again.  This is a
+# second line of defense, in case a connection does make it across fork.
+#
+# SQLAlchemy 1.4.24 and above call the DBAPI connection of a record
+# .dbapi_connection; earlier versions call it .connection.
+
+from sqlalchemy import event, exc
+
+
+@event.listens_for(engine, "connect")
+def _record_pid(dbapi_connection, connection_record):
+    connection_record.info["pid"] = os.getpid()
+
+
+@event.listens_for(engine, "checkout")
+def _check_pid(dbapi_connection, connection_record, connection_proxy):
+    if connection_record.info["pid"] != os.getpid():
+        _forget_dbapi_connection(connection_record)
+        _forget_dbapi_connection(connection_proxy)
+        raise exc.DisconnectionError(
+            "Connection record belongs to pid %s, attempting to check out "
+            "in pid %s" % (connection_record.info["pid"], os.getpid())
+        )
+
+
+def _forget_dbapi_connection(record):
+    if hasattr(record, "dbapi_connection"):
+        record.dbapi_connection = None
+    else:
+        record.connection = None
+
+
+### slide:: p
+# create the tables and generate a good amount of data.
+
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+NUM_USERS = 50000
+DOMAINS = ["gmail.com", "yahoo.com", "hotmail.com", "example.com", "aol.com"]
+
+random.seed(7)
+with engine.begin() as conn:
+    conn.execute(
+        user_table.insert(),
+        [
+            {"id": i, "username": f"user{i}", "fullname": f"User {i}"}
+            for i in range(1, NUM_USERS + 1)
+        ],
+    )
+    conn.execute(
+        address_table.insert(),
+        [
+            {
+                "user_id": i,
+                "email_address": f"User{i}.{n}@{random.choice(DOMAINS)}",
+            }
+            for i in range(1, NUM_USERS + 1)
+            for n in range(random.randint(1, 4))
+        ],
+    )
+
+### slide::
+### title:: Making the Engine safe after fork
+# The first thing a worker process does is give its copy of the Engine a
+# brand new, empty pool.  The inherited connections are left alone - not
+# used, and not closed, since closing them could also affect the parent's
+# connections.
+#
+# SQLAlchemy 1.4.33 and above spell this engine.dispose(close=False); on
+# earlier versions, the equivalent is to replace the pool ourselves.
+
+
+def reset_engine_after_fork(engine):
+    try:
+        engine.dispose(close=False)
+    except TypeError:
+        engine.pool = engine.pool.recreate()
+
+
+### slide::
+### title:: The ETL job
+# Each unit of work is a range of user_account primary keys.  The
+# "transform" normalizes each email address, pseudonymizes it with a
+# salted hash and counts addresses per domain; a worker returns the
+# counts for its ranges.
+
+import collections
+import hashlib
+
+from sqlalchemy import func, select
+
+SALT = b"sqla-tutorial"
+
+
+def process_range(engine, low, high):
+    domains = collections.Counter()
+    digests = 0
+    with engine.connect() as conn:
+        result = conn.execute(
+            select(address_table.c.email_address)
+            .join(user_table)
+            .where(user_table.c.id.between(low, high))
+        )
+        for (email,) in result:
+            local, _, domain = email.strip().lower().partition("@")
+            hashlib.pbkdf2_hmac("sha256", local.encode(), SALT, 50)
+            digests += 1
+            domains[domain] += 1
+    return domains, digests
+
+
+def partition(engine, num_partitions):
+    with engine.connect() as conn:
+        low, high = conn.execute(
+            select(func.min(user_table.c.id), func.max(user_table.c.id))
+        ).one()
+    size = (high - low) // num_partitions + 1
+    return [
+        (start, min(start + size - 1, high))
+        for start in range(low, high + 1, size)
+    ]
+
+
+### slide::
+# The runner.  Workers are started with the "fork" start method, so they
+# receive the Engine (and these functions) by inheritance rather than by
+# pickling.  Ranges go out over one queue and results come back over
+# another; there are several ranges per worker so that the faster workers
+# pick up the slack.
+
+import multiprocessing
+
+
+def _worker(engine, tasks, results):
+    reset_engine_after_fork(engine)
+    for low, high in iter(tasks.get, None):
+        results.put(process_range(engine, low, high))
+
+
+def run_etl(engine, num_workers, ranges_per_worker=4):
+    context = multiprocessing.get_context("fork")
+    tasks = context.Queue()
+    results = context.Queue()
+
+    ranges = partition(engine, num_workers * ranges_per_worker)
+    for rng in ranges:
+        tasks.put(rng)
+    for _ in range(num_workers):
+        tasks.put(None)
+
+    workers = [
+        context.Process(target=_worker, args=(engine, tasks, results))
+        for _ in range(num_workers)
+    ]
+    for worker in workers:
+        worker.start()
+
+    domains = collections.Counter()
+    digests = 0
+    for _ in ranges:
+        worker_domains, worker_digests = results.get()
+        domains.update(worker_domains)
+        digests += worker_digests
+
+    for worker in workers:
+        worker.join()
+    return domains, digests
+
+
+### slide:: p
+# the parent is holding a checked-out connection, and the pool holds
+# another, when we fork.  The workers don't touch either of them.
+
+parent_conn = engine.connect()
+with engine.connect() as conn:
+    conn.execute(select(func.count()).select_from(user_table)).scalar()
+
+run_etl(engine, 2)
+
+### slide:: p
+# the parent's connection still works fine afterwards.
+
+parent_conn.execute(select(func.count()).select_from(address_table)).scalar()
+
+### slide:: p
+### title:: Scaling with cores
+# the whole job with 1 .. N worker processes, compared to doing it in
+# this process.
+
+import time
+
+now = time.perf_counter()
+for low, high in partition(engine, 1):
+    process_range(engine, low, high)
+single = time.perf_counter() - now
+print(f"in process:  {single:6.2f} sec")
+
+for num_workers in sorted({1, 2, 4, os.cpu_count() or 1}):
+    now = time.perf_counter()
+    domains, digests = run_etl(engine, num_workers)
+    elapsed = time.perf_counter() - now
+    print(
+        f"{num_workers:2} workers:  {elapsed:6.2f} sec  "
+        f"speedup {single / elapsed:5.2f}x  ({digests} addresses)"
+    )
+
+### slide::
+parent_conn.close()
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,288 @@
+### slide::
+### title:: Read / Write Splitting
+# A common production setup has one primary database that takes all
+# writes, and read-only replicas that serve SELECTs.  Here we build a
+# Session that routes statements accordingly, using copies of a SQLite
+# file opened in read-only mode as stand-ins for replicas.
+
+from sqlalchemy import Column, ForeignKey, Integer, String
+from sqlalchemy.orm import registry
+from sqlalchemy.orm import relationship
+
+mapper_registry = registry()
+
+
+@mapper_registry.mapped
+class User:
+    __tablename__ = "user_account"
+
+    id = Column(Integer, primary_key=True)
+    username = Column(String)
+    fullname = Column(String)
+
+    addresses = relationship("Address", back_populates="user")
+
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+@mapper_registry.mapped
+class Address:
+    __tablename__ = "email_address"
+
+    id = Column(Integer, primary_key=True)
+    email_address = Column(String, nullable=False)
+    user_id = Column(ForeignKey("user_account.id"), nullable=False)
+
+    user = relationship("User", back_populates="addresses")
+
+    def __repr__(self):
+        return "<Address(%r)>" % self.email_address
+
+
+### slide:: p
+# the primary database.
+
+import os
+
+from sqlalchemy import create_engine
+
+if os.path.exists("primary.db"):
+    os.remove("primary.db")
+
+primary = create_engine("sqlite:///primary.db", future=True)
+with primary.begin() as connection:
+    mapper_registry.metadata.create_all(connection)
+
+### slide::
+# "replication" is done by copying the primary file with SQLite's backup
+# API.  Replicas are opened with the "mode=ro" URI parameter, so any
+# attempt to write to one fails.
+
+import sqlite3
+
+
+def replicate(num_replicas):
+    source = sqlite3.connect("primary.db")
+    for num in range(num_replicas):
+        dest = sqlite3.connect(f"replica_{num}.db")
+        source.backup(dest)
+        dest.close()
+    source.close()
+
+
+def replica_engines(num_replicas):
+    return [
+        create_engine(
+            f"sqlite:///file:replica_{num}.db?mode=ro&uri=true", future=True
+        )
+        for num in range(num_replicas)
+    ]
+
+
+### slide::
+### title:: RoutingSession
+# Session.get_bind() is called for every statement to decide which Engine
+# to use.  RoutingSession sends these to the primary:
+#
+# * everything emitted during a flush
+# * INSERT, UPDATE and DELETE statements executed directly
+# * SELECT .. FOR UPDATE, i.e. locking reads
+# * any SELECT once the current transaction has flushed, so that a
+#   Session always sees its own writes
+#
+# Other SELECTs go to a replica, chosen at random.  A Session holds
+# one connection per Engine per transaction, so a single transaction
+# that reads from a replica does so consistently from that replica.
+
+import random
+
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+
+class RoutingSession(Session):
+    def __init__(self, *arg, primary, replicas=(), **kw):
+        super().__init__(*arg, **kw)
+        self.primary = primary
+        self._replicas = list(replicas)
+        self._replica = None
+        self._wrote = False
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            not self._replicas
+            or self._flushing
+            or self._wrote
+            or _is_write(clause)
+        ):
+            return self.primary
+
+        if self._replica is None:
+            self._replica = random.choice(self._replicas)
+        return self._replica
+
+
+def _is_write(clause):
+    if clause is None:
+        return True
+    if getattr(clause, "is_dml", False):
+        return True
+    return getattr(clause, "_for_update_arg", None) is not None
+
+
+@event.listens_for(RoutingSession, "after_flush")
+def _after_flush(session, flush_context):
+    session._wrote = True
+
+
+@event.listens_for(RoutingSession, "after_transaction_end")
+def _after_transaction_end(session, transaction):
+    if transaction.parent is None:
+        session._wrote = False
+        session._replica = None
+
+
+### slide:: p
+# write some data to the primary, then replicate it to two replicas.
+
+from sqlalchemy.orm import sessionmaker
+
+with Session(primary, future=True) as session:
+    session.add_all(
+        [
+            User(
+                username="spongebob",
+                fullname="Spongebob Squarepants",
+                addresses=[Address(email_address="spongebob@gmail.com")],
+            ),
+            User(
+                username="sandy",
+                fullname="Sandy Cheeks",
+                addresses=[Address(email_address="sandy@yahoo.com")],
+            ),
+        ]
+    )
+    session.commit()
+
+replicate(2)
+
+replicas = replica_engines(2)
+
+Session = sessionmaker(
+    class_=RoutingSession, primary=primary, replicas=replicas, future=True
+)
+
+### slide:: p
+# a plain SELECT goes to a replica.  get_bind() shows us which one a
+# statement will use.
+
+from sqlalchemy import select
+
+session = Session()
+spongebob = session.execute(
+    select(User).filter_by(username="spongebob")
+).scalar_one()
+
+session.get_bind(clause=select(User)).url
+
+### slide:: p
+# a locking read goes to the primary
+
+session.execute(select(User).filter_by(username="sandy").with_for_update())
+session.get_bind(clause=select(User).with_for_update()).url
+
+### slide:: p
+# changes flush to the primary; the SELECT that autoflushes them, and
+# everything else in this transaction, also go to the primary.  The
+# replicas haven't seen the change.
+
+spongebob.fullname = "Spongebob Jones"
+session.execute(select(User.fullname).filter_by(username="spongebob")).all()
+
+### slide:: p
+# after commit, reads go to a replica again.  The replica will show the
+# old value until replicate() is run again; real replicas have a lag too.
+
+session.commit()
+session.execute(select(User.fullname).filter_by(username="spongebob")).all()
+
+### slide:: p
+
+replicate(2)
+session.execute(select(User.fullname).filter_by(username="spongebob")).all()
+
+### slide::
+session.close()
+
+### slide::
+### title:: Read throughput as replicas are added
+# a larger dataset, and a query that makes the database do some work.
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import func
+
+with RoutingSession(primary=primary, future=True) as session:
+    for chunk in range(10):
+        session.add_all(
+            [
+                User(
+                    username=f"user{chunk}_{i}",
+                    fullname=f"User {chunk} {i}",
+                    addresses=[
+                        Address(email_address=f"u{chunk}_{i}_{n}@x.com")
+                        for n in range(3)
+                    ],
+                )
+                for i in range(2500)
+            ]
+        )
+        session.commit()
+
+report = (
+    select(User.username, func.count(Address.id))
+    .join(User.addresses)
+    .group_by(User.id)
+    .order_by(func.count(Address.id).desc(), User.username)
+    .limit(10)
+)
+
+### slide:: p
+# NUM_THREADS workers each run the report a number of times, each in its
+# own Session.  With no replicas everything goes to the primary.
+
+NUM_THREADS = 8
+QUERIES_PER_THREAD = 5
+
+
+def worker(session_factory):
+    for _ in range(QUERIES_PER_THREAD):
+        with session_factory() as session:
+            session.execute(report).all()
+
+
+for num_replicas in [0, 1, 2, 4]:
+    replicate(num_replicas)
+    factory = sessionmaker(
+        class_=RoutingSession,
+        primary=primary,
+        replicas=replica_engines(num_replicas),
+        future=True,
+    )
+
+    now = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=NUM_THREADS) as pool:
+        list(pool.map(worker, [factory] * NUM_THREADS))
+    elapsed = time.perf_counter() - now
+
+    print(
+        f"{num_replicas} replicas: "
+        f"{NUM_THREADS * QUERIES_PER_THREAD / elapsed:8.2f} queries/sec"
+    )
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,384 @@
+### slide::
+### title:: Horizontal Sharding
+# Every deck so far uses a single database.  Here we spread user_account
+# and email_address across several SQLite files, keeping each user's
+# addresses in the same file as the user, and query them all at once.
+
+from sqlalchemy import MetaData, Table, Column, ForeignKey, Index
+from sqlalchemy import Integer, String
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True, autoincrement=False),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+)
+
+address_table = Table(
+    "email_address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", ForeignKey("user_account.id"), nullable=False),
+    Column("email_address", String(100), nullable=False),
+)
+
+Index("ix_user_account_username", user_table.c.username)
+Index("ix_email_address_user_id", address_table.c.user_id)
+
+### slide::
+# user_account.id has autoincrement turned off; a primary key has to be
+# unique across every shard, and it also decides which shard a row
+# lives in, so we assign it ourselves before the row is INSERTed.  A
+# real deployment would use a sequence, a ticket table or UUIDs; here
+# it's a counter.
+
+import itertools
+import threading
+
+_id_lock = threading.Lock()
+_ids = itertools.count(1)
+
+
+def next_user_id():
+    with _id_lock:
+        return next(_ids)
+
+
+def shard_for(user_id, num_shards):
+    return user_id % num_shards
+
+### slide:: p
+# create_shards() creates num_shards SQLite files in a directory, each
+# with the full schema, and returns an Engine for each one.
+
+import os
+import shutil
+
+from sqlalchemy import create_engine
+
+
+def create_shards(num_shards, directory="shards"):
+    path = os.path.join(directory, str(num_shards))
+    if os.path.exists(path):
+        shutil.rmtree(path)
+    os.makedirs(path)
+
+    engines = []
+    for shard in range(num_shards):
+        engine = create_engine(
+            f"sqlite:///{path}/shard_{shard}.db", future=True
+        )
+        with engine.begin() as conn:
+            metadata.create_all(conn)
+        engines.append(engine)
+    return engines
+
+
+engines = create_shards(4)
+
+### slide::
+### title:: Writes and reads with ShardedSession
+# The ORM includes ShardedSession, which asks a set of functions which
+# shard (here, which engine) to use:
+#
+# * shard_chooser - the shard for an object being flushed
+# * id_chooser - the shards that may contain a given primary key
+# * execute_chooser - the shards to run a SELECT against
+#
+# Objects loaded from a shard remember it as their "identity token", so
+# lazy loads and UPDATEs of those objects go to the same shard.
+
+from sqlalchemy import event
+from sqlalchemy.orm import registry, relationship
+
+
+class User:
+    def __repr__(self):
+        return "<User(%r, %r)>" % (self.username, self.fullname)
+
+
+class Address:
+    def __repr__(self):
+        return "<Address(%r)>" % self.email_address
+
+
+mapper_registry = registry()
+mapper_registry.map_imperatively(
+    User,
+    user_table,
+    properties={
+        "addresses": relationship(Address, back_populates="user"),
+    },
+)
+mapper_registry.map_imperatively(
+    Address,
+    address_table,
+    properties={"user": relationship(User, back_populates="addresses")},
+)
+
+
+@event.listens_for(User, "init")
+def _assign_id(target, args, kwargs):
+    if "id" not in kwargs:
+        target.id = next_user_id()
+
+
+### slide::
+# the chooser functions.  An Address goes wherever its User goes.
+
+from sqlalchemy.ext.horizontal_shard import ShardedSession
+
+
+def sharded_session(engines):
+    num_shards = len(engines)
+    shard_ids = [str(shard) for shard in range(num_shards)]
+
+    def shard_chooser(mapper, instance, clause=None):
+        if isinstance(instance, Address):
+            instance = instance.user
+        return str(shard_for(instance.id, num_shards))
+
+    def id_chooser(query, ident):
+        if query.column_descriptions[0]["type"] is User:
+            return [str(shard_for(ident[0], num_shards))]
+        return shard_ids
+
+    def execute_chooser(orm_context):
+        return shard_ids
+
+    return ShardedSession(
+        shard_chooser=shard_chooser,
+        id_chooser=id_chooser,
+        execute_chooser=execute_chooser,
+        shards={str(shard): engine for shard, engine in enumerate(engines)},
+        future=True,
+    )
+
+
+### slide:: p
+# users and their addresses are INSERTed into the shard chosen by user id.
+
+session = sharded_session(engines)
+session.add_all(
+    [
+        User(
+            username="spongebob",
+            fullname="Spongebob Squarepants",
+            addresses=[Address(email_address="spongebob@gmail.com")],
+        ),
+        User(
+            username="sandy",
+            fullname="Sandy Cheeks",
+            addresses=[Address(email_address="sandy@yahoo.com")],
+        ),
+        User(
+            username="patrick",
+            fullname="Patrick Star",
+            addresses=[Address(email_address="patrick@gmail.com")],
+        ),
+        User(
+            username="squidward",
+            fullname="Squidward Tentacles",
+            addresses=[
+                Address(email_address="squidward@gmail.com"),
+                Address(email_address="squidward@hotmail.com"),
+            ],
+        ),
+    ]
+)
+session.commit()
+
+### slide:: p
+# get() goes straight to one shard; the lazy load of .addresses goes to
+# the same shard.
+
+squidward = session.get(User, 4)
+squidward.addresses
+
+### slide:: p
+# a SELECT with no shard given runs against every shard, one after the
+# other, and concatenates the results.  Note that the ORDER BY is only
+# applied within each shard.
+
+from sqlalchemy import select
+
+session.execute(select(User).order_by(User.username)).scalars().all()
+
+### slide::
+session.close()
+
+### slide::
+### title:: Parallel fan-out
+# fan_out() runs a Core select() against each engine on a thread pool,
+# then merges the results from each shard according to the statement's
+# ORDER BY.  Each shard's rows are already sorted, so heapq.merge() can
+# combine them lazily.  With a LIMIT and OFFSET, each shard is asked for
+# the first LIMIT + OFFSET rows, since any of those might be among the
+# rows wanted; the OFFSET and LIMIT are then applied to the merged result.
+#
+# Rows are compared in Python, so every ORDER BY column has to go in the
+# same direction, and can't be NULL; comparing None with a value raises
+# TypeError from heapq.merge().
+
+import heapq
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy.sql import operators
+from sqlalchemy.sql.elements import UnaryExpression, _label_reference
+
+
+def fan_out(engines, stmt, executor):
+    limit, offset = stmt._limit, stmt._offset or 0
+    shard_stmt = stmt.limit(None).offset(None)
+    if limit is not None:
+        shard_stmt = shard_stmt.limit(limit + offset)
+
+    def run(engine):
+        with engine.connect() as conn:
+            return conn.execute(shard_stmt).all()
+
+    results = list(executor.map(run, engines))
+    order_by = _order_by(stmt)
+    if not order_by:
+        merged = itertools.chain(*results)
+    else:
+        columns, reverse = order_by
+        merged = heapq.merge(
+            *results,
+            key=lambda row: tuple(row._mapping[col] for col in columns),
+            reverse=reverse,
+        )
+
+    end = offset + limit if limit is not None else None
+    return list(itertools.islice(merged, offset, end))
+
+
+def _order_by(stmt):
+    columns = []
+    directions = set()
+    for clause in stmt._order_by_clauses:
+        # ordering by a label is wrapped in a _label_reference
+        if isinstance(clause, _label_reference):
+            clause = clause.element
+        if isinstance(clause, UnaryExpression) and clause.modifier in (
+            operators.asc_op,
+            operators.desc_op,
+        ):
+            columns.append(clause.element)
+            directions.add(clause.modifier is operators.desc_op)
+        else:
+            columns.append(clause)
+            directions.add(False)
+    if len(directions) > 1:
+        raise ValueError(
+            "mixed ASC / DESC ordering can't be merged with heapq.merge()"
+        )
+    return (columns, directions.pop()) if columns else None
+
+
+### slide:: p
+# the same ordered query, now ordered across all shards.
+
+pool = ThreadPoolExecutor(max_workers=len(engines))
+
+fan_out(engines, select(user_table).order_by(user_table.c.username), pool)
+
+### slide:: p
+# ordering can use any column present in the rows, including labels.
+
+from sqlalchemy import func
+
+address_count = func.count(address_table.c.id).label("address_count")
+fan_out(
+    engines,
+    select(user_table.c.username, address_count)
+    .join(address_table)
+    .group_by(user_table.c.id)
+    .order_by(address_count.desc())
+    .limit(2),
+    pool,
+)
+
+### slide::
+### title:: How far does it scale?
+# generate the same dataset into 1, 2, 4 and 8 shards using Core
+# executemany() batches, one per shard.
+
+import time
+
+NUM_USERS = 100000
+SHARD_COUNTS = [1, 2, 4, 8]
+
+shard_sets = {}
+for num_shards in SHARD_COUNTS:
+    shard_sets[num_shards] = shard_engines = create_shards(num_shards)
+
+    users = [[] for _ in range(num_shards)]
+    addresses = [[] for _ in range(num_shards)]
+    for user_id in range(1, NUM_USERS + 1):
+        shard = shard_for(user_id, num_shards)
+        users[shard].append(
+            {"id": user_id, "username": f"user{user_id}", "fullname": ""}
+        )
+        addresses[shard].extend(
+            {"user_id": user_id, "email_address": f"u{user_id}_{n}@x.com"}
+            for n in range(3)
+        )
+
+    for shard, engine in enumerate(shard_engines):
+        with engine.begin() as conn:
+            conn.execute(user_table.insert(), users[shard])
+            conn.execute(address_table.insert(), addresses[shard])
+
+### slide:: p
+# a query that does a lot of work in the database and returns few rows:
+# the ten users with the longest total email address length.  SQLite
+# releases the GIL while it runs, so given more than one CPU core, the
+# shards' queries can run at the same time.  How much that saves depends
+# on the cores available; on a single core, parallel is no faster than
+# serial.
+
+total_length = func.sum(func.length(address_table.c.email_address)).label(
+    "total_length"
+)
+heavy = (
+    select(user_table.c.username, total_length)
+    .join(address_table)
+    .group_by(user_table.c.id)
+    .order_by(total_length.desc(), user_table.c.username.desc())
+    .limit(10)
+)
+
+# a query that returns many rows, where Python-side row processing
+# dominates and holds the GIL.
+wide = select(user_table).order_by(user_table.c.username)
+
+
+def timed(fn):
+    now = time.perf_counter()
+    fn()
+    return (time.perf_counter() - now) * 1000
+
+
+class _Serial:
+    def map(self, fn, items):
+        return [fn(item) for item in items]
+
+
+for label, stmt in [("aggregate", heavy), ("all rows", wide)]:
+    for num_shards in SHARD_COUNTS:
+        shard_engines = shard_sets[num_shards]
+        with ThreadPoolExecutor(max_workers=num_shards) as pool:
+            parallel_ms = timed(lambda: fan_out(shard_engines, stmt, pool))
+        serial_ms = timed(lambda: fan_out(shard_engines, stmt, _Serial()))
+        print(
+            f"{label:<10} {num_shards} shards:  serial {serial_ms:8.2f} ms"
+            f"   parallel {parallel_ms:8.2f} ms"
+        )
+
+### slide::
+### title:: Questions?
+
+### slide::
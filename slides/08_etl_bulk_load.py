@@ -0,0 +1,293 @@
+### slide::
+### title:: Streaming Bulk Loads
+# So far we've seeded tables with lists of dictionaries written inline.
+# Here we load CSV and newline-delimited JSON files of any size, with a
+# pipeline of generators: read records, convert their values according to
+# each Column's type, group them into batches for executemany(), and
+# commit every so often.  Only one batch is in memory at a time.
+#
+# These are the tables from the Schema and MetaData section.
+
+from sqlalchemy import MetaData, Table, Column, ForeignKey
+from sqlalchemy import ForeignKeyConstraint
+from sqlalchemy import Integer, String, Text, DateTime
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50), nullable=False),
+    Column("fullname", String(255)),
+)
+
+addresses_table = Table(
+    "email_address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("email_address", String(100), nullable=False),
+    Column("user_id", ForeignKey("user_account.id"), nullable=False),
+)
+
+story_table = Table(
+    "story",
+    metadata,
+    Column("story_id", Integer, primary_key=True),
+    Column("version_id", Integer, primary_key=True),
+    Column("headline", String(100), nullable=False),
+    Column("body", Text),
+)
+
+published_table = Table(
+    "published",
+    metadata,
+    Column("pub_id", Integer, primary_key=True),
+    Column("pub_timestamp", DateTime, nullable=False),
+    Column("story_id", Integer),
+    Column("version_id", Integer),
+    ForeignKeyConstraint(
+        ["story_id", "version_id"], ["story.story_id", "story.version_id"]
+    ),
+)
+
+### slide:: p
+# generate input files: CSV for user_account and story, newline-delimited
+# JSON for email_address and published.  In CSV every value is a string
+# and an empty field means NULL.
+
+import csv
+import datetime
+import json
+
+NUM_USERS = 100000
+NUM_STORIES = 20000
+
+with open("bulk_load_user_account.csv", "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["id", "username", "fullname"])
+    for i in range(1, NUM_USERS + 1):
+        writer.writerow([i, f"user{i}", f"User {i}" if i % 10 else ""])
+
+with open("email_address.jsonl", "w") as f:
+    for i in range(1, NUM_USERS * 2 + 1):
+        f.write(
+            json.dumps(
+                {
+                    "id": i,
+                    "email_address": f"user{i}@example.com",
+                    "user_id": (i + 1) // 2,
+                }
+            )
+            + "\n"
+        )
+
+with open("bulk_load_story.csv", "w", newline="") as f:
+    writer = csv.writer(f)
+    writer.writerow(["story_id", "version_id", "headline", "body"])
+    for i in range(1, NUM_STORIES + 1):
+        for version in (1, 2):
+            writer.writerow(
+                [i, version, f"Headline {i} v{version}", "Lorem ipsum " * 20]
+            )
+
+start = datetime.datetime(2021, 1, 1)
+with open("published.jsonl", "w") as f:
+    for i in range(1, NUM_STORIES + 1):
+        f.write(
+            json.dumps(
+                {
+                    "pub_id": i,
+                    "pub_timestamp": (
+                        start + datetime.timedelta(hours=i)
+                    ).isoformat(),
+                    "story_id": i,
+                    "version_id": 2,
+                }
+            )
+            + "\n"
+        )
+
+### slide::
+### title:: Reading records
+# both readers yield one dictionary per record, lazily.
+
+
+def read_csv(path):
+    with open(path, newline="") as f:
+        yield from csv.DictReader(f)
+
+
+def read_ndjson(path):
+    with open(path) as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+### slide::
+### title:: Converting values by column type
+# Each type knows the Python type it corresponds to, as .python_type.
+# Most of those can be called with a string to convert it; a few need
+# parsing functions instead.  Values that are already the right type,
+# as JSON numbers usually are, are passed through.
+
+import decimal
+
+
+def _parse_bool(value):
+    return value.strip().lower() in ("1", "t", "true", "y", "yes")
+
+
+_parsers = {
+    datetime.datetime: datetime.datetime.fromisoformat,
+    datetime.date: datetime.date.fromisoformat,
+    datetime.time: datetime.time.fromisoformat,
+    decimal.Decimal: decimal.Decimal,
+    bool: _parse_bool,
+}
+
+
+def converter(column):
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return lambda value: value
+
+    parse = _parsers.get(python_type, python_type)
+
+    def convert(value):
+        if value == "":
+            # an empty CSV field is NULL, unless the column is a NOT NULL
+            # string, where it's an empty string
+            if python_type is str and not column.nullable:
+                return value
+            return None
+        if value is None or isinstance(value, python_type):
+            return value
+        return parse(value)
+
+    return convert
+
+
+def coerce_records(table, records):
+    converters = {col.key: converter(col) for col in table.c}
+    for record in records:
+        yield {
+            key: converters[key](value)
+            for key, value in record.items()
+            if key in converters
+        }
+
+
+### slide:: i
+# for example, CSV rows for user_account
+
+import itertools
+
+records = coerce_records(
+    user_table, read_csv("bulk_load_user_account.csv")
+)
+list(itertools.islice(records, 8, 11))
+
+### slide:: i
+# and JSON rows for published
+
+next(coerce_records(published_table, read_ndjson("published.jsonl")))
+
+### slide::
+### title:: Batching and committing
+# batched() groups any iterable into lists of batch_size.  load() runs an
+# executemany() INSERT per batch and commits every commit_every batches,
+# so a failure part way through only loses the current uncommitted
+# batches, and the database's transaction log stays a reasonable size.
+# It returns the number of rows loaded and rows per second.
+
+import time
+
+
+def batched(iterable, batch_size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def load(engine, table, records, batch_size=1000, commit_every=10):
+    now = time.perf_counter()
+    num_rows = 0
+    insert = table.insert()
+    with engine.connect() as conn:
+        for num, batch in enumerate(
+            batched(coerce_records(table, records), batch_size), 1
+        ):
+            conn.execute(insert, batch)
+            num_rows += len(batch)
+            if num % commit_every == 0:
+                conn.commit()
+        conn.commit()
+    elapsed = time.perf_counter() - now
+    return num_rows, round(num_rows / elapsed)
+
+
+### slide:: p
+# a new SQLite file database, loaded in foreign key order.
+
+import os
+
+from sqlalchemy import create_engine
+
+if os.path.exists("bulk_load.db"):
+    os.remove("bulk_load.db")
+
+engine = create_engine("sqlite:///bulk_load.db", future=True)
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+for table, records in [
+    (user_table, read_csv("bulk_load_user_account.csv")),
+    (addresses_table, read_ndjson("email_address.jsonl")),
+    (story_table, read_csv("bulk_load_story.csv")),
+    (published_table, read_ndjson("published.jsonl")),
+]:
+    num_rows, rows_per_sec = load(engine, table, records)
+    print(f"{table.name:<16} {num_rows:>8} rows  {rows_per_sec:>8} rows/sec")
+
+### slide:: p
+# check what arrived
+
+from sqlalchemy import select, func
+
+with engine.connect() as conn:
+    print(
+        conn.execute(
+            select(
+                func.count(user_table.c.id), func.count(user_table.c.fullname)
+            )
+        ).one()
+    )
+    print(conn.execute(select(published_table).limit(2)).all())
+
+### slide:: p
+### title:: Choosing a batch size
+# reload user_account with different batch sizes.  One row per batch is
+# one execute() per row, the way a naive loader works.
+
+for batch_size in [1, 10, 100, 1000, 10000]:
+    with engine.begin() as conn:
+        conn.execute(addresses_table.delete())
+        conn.execute(user_table.delete())
+    num_rows, rows_per_sec = load(
+        engine,
+        user_table,
+        read_csv("bulk_load_user_account.csv"),
+        batch_size=batch_size,
+        commit_every=max(1, 10000 // batch_size),
+    )
+    print(f"batch size {batch_size:>6}: {rows_per_sec:>8} rows/sec")
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,326 @@
+### slide::
+### title:: Columnar Results
+# Analytics code usually wants columns, not rows.  The common approach of
+# handing result.all() to a DataFrame builds a Row object for every row,
+# then takes them all apart again.  Here we fill NumPy structured arrays
+# and Arrow record batches directly, column by column, from a Result.
+#
+# This deck requires numpy, pyarrow and pandas:
+#
+#     .venv/bin/pip install numpy pyarrow pandas
+
+from sqlalchemy import MetaData, Table, Column
+from sqlalchemy import String, Numeric, DateTime, Enum
+
+metadata = MetaData()
+
+fancy_table = Table(
+    "fancy",
+    metadata,
+    Column("key", String(50), primary_key=True),
+    Column("timestamp", DateTime),
+    Column("amount", Numeric(10, 2)),
+    Column("type", Enum("a", "b", "c")),
+)
+
+### slide:: p
+# new SQLite database with lots of rows.  Some timestamps and amounts are
+# NULL.
+
+import datetime
+import decimal
+import random
+
+from sqlalchemy import create_engine
+
+NUM_ROWS = 200000
+
+engine = create_engine("sqlite://", future=True)
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+random.seed(3)
+start = datetime.datetime(2021, 1, 1)
+with engine.begin() as conn:
+    conn.execute(
+        fancy_table.insert(),
+        [
+            {
+                "key": f"key{i:07d}",
+                "timestamp": start + datetime.timedelta(seconds=i * 37)
+                if i % 50
+                else None,
+                "amount": decimal.Decimal(random.randint(0, 10 ** 6)) / 100
+                if i % 70
+                else None,
+                "type": random.choice("abc"),
+            }
+            for i in range(NUM_ROWS)
+        ],
+    )
+
+### slide::
+### title:: Mapping column types
+# Each Column's type tells us what to allocate.  NumPy has no NULL, so
+# NULLs become NaN for floats and NaT for datetimes.  Integer columns
+# that allow NULL become float64, and String columns that allow NULL are
+# kept as Python objects, where None stays None; a fixed width "U" column
+# would store it as the string 'None'.  Arrow has NULLs for every type,
+# and can keep Numeric as an exact decimal and Enum as a
+# dictionary-encoded column.
+#
+# Enum is a subclass of String, and Float of Numeric, so the order of the
+# checks matters.
+
+import numpy
+import pyarrow
+
+from sqlalchemy import Enum, Float, Integer
+
+
+def numpy_dtype(column):
+    type_ = column.type
+    if isinstance(type_, String) and column.nullable:
+        return "O"
+    elif isinstance(type_, Enum):
+        return "U%d" % max(len(e) for e in type_.enums)
+    elif isinstance(type_, String):
+        return "U%d" % type_.length if type_.length else "O"
+    elif isinstance(type_, DateTime):
+        return "datetime64[us]"
+    elif isinstance(type_, (Numeric, Float)):
+        return "float64"
+    elif isinstance(type_, Integer):
+        return "float64" if column.nullable else "int64"
+    else:
+        return "O"
+
+
+def arrow_type(column):
+    type_ = column.type
+    if isinstance(type_, Enum):
+        return pyarrow.dictionary(pyarrow.int8(), pyarrow.string())
+    elif isinstance(type_, String):
+        return pyarrow.string()
+    elif isinstance(type_, DateTime):
+        return pyarrow.timestamp("us")
+    elif isinstance(type_, Float):
+        return pyarrow.float64()
+    elif isinstance(type_, Numeric):
+        return pyarrow.decimal128(type_.precision or 38, type_.scale or 0)
+    elif isinstance(type_, Integer):
+        return pyarrow.int64()
+    else:
+        raise TypeError("no Arrow type for %r" % type_)
+
+
+### slide:: i
+# the dtype for fancy_table
+
+numpy.dtype([(col.name, numpy_dtype(col)) for col in fancy_table.c])
+
+### slide::
+### title:: Filling a structured array
+# to_structured_array() fetches the Result in partitions, and for each
+# partition transposes the rows with zip() and assigns each column into a
+# slice of the preallocated array, letting NumPy convert the whole slice
+# at once (None becomes NaN or NaT on the way).  If the number of rows
+# isn't given, the array grows by doubling and is trimmed at the end.
+#
+# The columns are the Column objects the statement selects, in order,
+# e.g. stmt.selected_columns.
+
+
+def to_structured_array(result, columns, num_rows=None, partition_size=10000):
+    dtype = numpy.dtype([(col.name, numpy_dtype(col)) for col in columns])
+    array = numpy.empty(num_rows or partition_size, dtype=dtype)
+    names = dtype.names
+
+    position = 0
+    for partition in result.partitions(partition_size):
+        end = position + len(partition)
+        if end > len(array):
+            array = numpy.resize(array, max(end, len(array) * 2))
+        for name, values in zip(names, zip(*partition)):
+            array[name][position:end] = numpy.asarray(values, dtype[name])
+        position = end
+    return array[:position]
+
+
+### slide:: p
+
+from sqlalchemy import select, func
+
+stmt = select(fancy_table).order_by(fancy_table.c.key)
+
+with engine.connect() as conn:
+    num_rows = conn.execute(
+        select(func.count()).select_from(fancy_table)
+    ).scalar()
+    array = to_structured_array(
+        conn.execute(stmt), stmt.selected_columns, num_rows
+    )
+
+array[0:5]
+
+### slide:: i
+# columns are NumPy arrays; no Python objects involved
+
+array["amount"].dtype, numpy.nanmean(array["amount"])
+
+### slide::
+### title:: Arrow record batches
+# record_batches() yields one pyarrow.RecordBatch per partition; each
+# column is converted with pyarrow.array() and the Arrow type from the
+# Column.  A Table can be assembled from the batches, or they can be
+# streamed to a file or a socket as they arrive.
+#
+# With storage=True, the values are in their database storage format
+# (see below) and are cast to the Arrow type after conversion.
+
+
+def record_batches(result, columns, partition_size=10000, storage=False):
+    schema = pyarrow.schema(
+        [
+            pyarrow.field(col.name, arrow_type(col), nullable=col.nullable)
+            for col in columns
+        ]
+    )
+    for partition in result.partitions(partition_size):
+        yield pyarrow.RecordBatch.from_arrays(
+            [
+                pyarrow.array(values).cast(field.type)
+                if storage
+                else pyarrow.array(values, type=field.type)
+                for field, values in zip(schema, zip(*partition))
+            ],
+            schema=schema,
+        )
+
+
+### slide:: p
+
+with engine.connect() as conn:
+    table = pyarrow.Table.from_batches(
+        record_batches(conn.execute(stmt), stmt.selected_columns)
+    )
+
+table.schema
+
+### slide:: i
+
+table.slice(0, 5).to_pandas()
+
+### slide::
+### title:: Skipping result processors
+# On SQLite, DateTime is stored as an ISO string, Numeric as floating
+# point and Enum as a string.  SQLAlchemy converts each value to a Python
+# datetime, Decimal or Enum value as rows are fetched.  NumPy and Arrow
+# can parse the stored form in bulk themselves, so storage_columns()
+# uses type_coerce() to fetch the columns as their storage types and skip
+# that step.  This is specific to how SQLite stores these types.
+
+from sqlalchemy import type_coerce
+
+
+def storage_columns(columns):
+    coerced = []
+    for col in columns:
+        if isinstance(col.type, (DateTime, Enum)):
+            col = type_coerce(col, String).label(col.name)
+        elif isinstance(col.type, Numeric) and not isinstance(col.type, Float):
+            col = type_coerce(col, Float).label(col.name)
+        coerced.append(col)
+    return coerced
+
+
+storage_stmt = select(*storage_columns(fancy_table.c)).order_by(
+    fancy_table.c.key
+)
+
+### slide:: p
+# the same array, from storage values
+
+with engine.connect() as conn:
+    also_array = to_structured_array(
+        conn.execute(storage_stmt), stmt.selected_columns, num_rows
+    )
+
+also_array[0:5]
+
+### slide::
+### title:: How long does it take?
+# each approach ends up with a pandas DataFrame, starting from the same
+# statement.  The first two build one Row object per row.
+
+import time
+
+import pandas
+
+
+def from_rows(conn):
+    result = conn.execute(stmt)
+    return pandas.DataFrame(result.all(), columns=list(result.keys()))
+
+
+def from_records(conn):
+    result = conn.execute(stmt)
+    return pandas.DataFrame.from_records(
+        iter(result), columns=list(result.keys())
+    )
+
+
+def from_structured_array(conn):
+    return pandas.DataFrame(
+        to_structured_array(
+            conn.execute(stmt), stmt.selected_columns, num_rows
+        )
+    )
+
+
+def from_arrow(conn):
+    return pyarrow.Table.from_batches(
+        record_batches(conn.execute(stmt), stmt.selected_columns)
+    ).to_pandas()
+
+
+def from_storage_structured_array(conn):
+    return pandas.DataFrame(
+        to_structured_array(
+            conn.execute(storage_stmt), stmt.selected_columns, num_rows
+        )
+    )
+
+
+def from_storage_arrow(conn):
+    return pyarrow.Table.from_batches(
+        record_batches(
+            conn.execute(storage_stmt), stmt.selected_columns, storage=True
+        )
+    ).to_pandas()
+
+
+### slide:: p
+# the time spent running the SELECT and fetching the rows, for reference,
+# then each conversion.
+
+def timed(label, fn):
+    with engine.connect() as conn:
+        now = time.perf_counter()
+        fn(conn)
+        elapsed = time.perf_counter() - now
+    print(f"{label:<28} {elapsed * 1000:9.2f} ms")
+
+
+timed("fetch only", lambda conn: conn.execute(stmt).all())
+timed("DataFrame(result.all())", from_rows)
+timed("DataFrame.from_records()", from_records)
+timed("structured array", from_structured_array)
+timed("arrow record batches", from_arrow)
+timed("structured array, storage", from_storage_structured_array)
+timed("arrow, storage", from_storage_arrow)
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -0,0 +1,375 @@
+### slide::
+### title:: Streaming Export to CSV and Parquet
+# Calling .all() on a large result loads every row into memory at once.
+# Here we export any select() to a CSV or Parquet file in chunks, keeping
+# memory use bounded by the chunk size no matter how big the table is.
+#
+# The Parquet part of this deck requires pyarrow:
+#
+#     .venv/bin/pip install pyarrow
+
+from sqlalchemy import MetaData, Table, Column, ForeignKey
+from sqlalchemy import Integer, String, DateTime
+
+metadata = MetaData()
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(50)),
+    Column("fullname", String(50)),
+    Column("created_at", DateTime),
+)
+
+address_table = Table(
+    "email_address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", ForeignKey("user_account.id"), nullable=False),
+    Column("email_address", String(100), nullable=False),
+)
+
+### slide:: p
+# a SQLite file database with a few hundred thousand rows, generated in
+# batches so that this step doesn't inflate the memory numbers below.
+
+import datetime
+import os
+
+from sqlalchemy import create_engine
+
+NUM_USERS = 200000
+
+if os.path.exists("export.db"):
+    os.remove("export.db")
+
+engine = create_engine("sqlite:///export.db", future=True)
+with engine.begin() as conn:
+    metadata.create_all(conn)
+
+start = datetime.datetime(2021, 1, 1)
+with engine.begin() as conn:
+    for batch in range(1, NUM_USERS + 1, 10000):
+        ids = range(batch, min(batch + 10000, NUM_USERS + 1))
+        conn.execute(
+            user_table.insert(),
+            [
+                {
+                    "id": i,
+                    "username": f"user{i}",
+                    "fullname": f"User Number {i}",
+                    "created_at": start + datetime.timedelta(minutes=i),
+                }
+                for i in ids
+            ],
+        )
+        conn.execute(
+            address_table.insert(),
+            [
+                {"user_id": i, "email_address": f"user{i}.{n}@example.com"}
+                for i in ids
+                for n in range(2)
+            ],
+        )
+
+### slide::
+### title:: Writers
+# a writer receives the column names and types once, then chunks of rows.
+# CSVWriter uses the csv module; values are written with str(), so
+# datetimes come out in ISO format and NULL becomes an empty field.
+
+import csv
+
+
+class CSVWriter:
+    def __init__(self, path):
+        self.path = path
+
+    def open(self, names, types):
+        self._file = open(self.path, "w", newline="")
+        self._writer = csv.writer(self._file)
+        self._writer.writerow(names)
+
+    def write(self, rows):
+        self._writer.writerows(rows)
+
+    def close(self):
+        self._file.close()
+
+
+### slide::
+# ParquetWriter turns each chunk into an Arrow record batch using the
+# column types, and writes a row group each time row_group_size rows
+# have accumulated.  Memory use is then bounded by the row group size,
+# which also determines how efficiently readers can skip through the file.
+
+from sqlalchemy import Boolean, Float, Numeric
+
+
+def arrow_type(type_):
+    import pyarrow
+
+    if isinstance(type_, DateTime):
+        return pyarrow.timestamp("us")
+    elif isinstance(type_, Boolean):
+        return pyarrow.bool_()
+    elif isinstance(type_, Integer):
+        return pyarrow.int64()
+    elif isinstance(type_, Float):
+        return pyarrow.float64()
+    elif isinstance(type_, Numeric):
+        return pyarrow.decimal128(type_.precision or 38, type_.scale or 0)
+    else:
+        return pyarrow.string()
+
+
+class ParquetWriter:
+    def __init__(self, path, row_group_size=100000):
+        self.path = path
+        self.row_group_size = row_group_size
+
+    def open(self, names, types):
+        import pyarrow
+        import pyarrow.parquet
+
+        self._schema = pyarrow.schema(
+            [(name, arrow_type(type_)) for name, type_ in zip(names, types)]
+        )
+        self._writer = pyarrow.parquet.ParquetWriter(self.path, self._schema)
+        self._batches = []
+        self._pending = 0
+
+    def write(self, rows):
+        import pyarrow
+
+        self._batches.append(
+            pyarrow.RecordBatch.from_arrays(
+                [
+                    pyarrow.array(values, type=field.type)
+                    for field, values in zip(self._schema, zip(*rows))
+                ],
+                schema=self._schema,
+            )
+        )
+        self._pending += len(rows)
+        if self._pending >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        import pyarrow
+
+        if self._batches:
+            self._writer.write_table(
+                pyarrow.Table.from_batches(self._batches),
+                row_group_size=self.row_group_size,
+            )
+        self._batches = []
+        self._pending = 0
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+
+
+### slide::
+### title:: The exporter
+# export() executes the statement with the stream_results execution option,
+# which asks the driver for a server side cursor where one is available,
+# and fetches it in chunks with Result.partitions().  For an ORM statement
+# run by a Session, the yield_per execution option does the same for
+# loading objects, and layout() expands each object in a row into the
+# values of its column attributes.
+#
+# It returns the number of rows, rows per second, and the process' peak
+# resident memory in megabytes as of the end of the export.  Peak RSS only
+# ever goes up, so when comparing approaches, run the hungriest one last.
+
+import collections
+import resource
+import sys
+import time
+
+from sqlalchemy import inspect
+
+ExportStats = collections.namedtuple(
+    "ExportStats", ["rows", "rows_per_sec", "peak_rss_mb"]
+)
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / (1024 * 1024 if sys.platform == "darwin" else 1024)
+
+
+def layout(stmt, keys):
+    """Return the column names and types of a statement's rows, and a
+    function that turns a chunk of its rows into plain values."""
+    try:
+        descriptions = stmt.column_descriptions
+    except NotImplementedError:
+        # a Core select()
+        descriptions = []
+    entities = {
+        index: [attr.key for attr in inspect(d["entity"]).mapper.column_attrs]
+        for index, d in enumerate(descriptions)
+        if d["expr"] is d["entity"]
+    }
+    if not entities:
+        return keys, [col.type for col in stmt.selected_columns], list
+
+    names, types = [], []
+    for index, description in enumerate(descriptions):
+        if index not in entities:
+            names.append(description["name"])
+            types.append(description["type"])
+            continue
+        mapper = inspect(description["entity"]).mapper
+        name = description["name"] or mapper.class_.__name__
+        for attr_key in entities[index]:
+            # prefixed with the entity's name if there's more than one
+            names.append(
+                attr_key
+                if len(descriptions) == 1
+                else "%s_%s" % (name, attr_key)
+            )
+            types.append(mapper.attrs[attr_key].columns[0].type)
+
+    def expand(rows):
+        return [
+            tuple(
+                value
+                for index, item in enumerate(row)
+                for value in (
+                    [getattr(item, attr_key) for attr_key in entities[index]]
+                    if index in entities
+                    else (item,)
+                )
+            )
+            for row in rows
+        ]
+
+    return names, types, expand
+
+
+def export(executor, stmt, writer, chunk_size=10000):
+    now = time.perf_counter()
+    result = executor.execute(
+        stmt.execution_options(stream_results=True, yield_per=chunk_size)
+    )
+    names, types, expand = layout(stmt, list(result.keys()))
+    writer.open(names, types)
+    num_rows = 0
+    try:
+        for partition in result.partitions(chunk_size):
+            writer.write(expand(partition))
+            num_rows += len(partition)
+    finally:
+        writer.close()
+    elapsed = time.perf_counter() - now
+    return ExportStats(num_rows, round(num_rows / elapsed), peak_rss_mb())
+
+
+### slide:: p
+# a whole table to CSV
+
+from sqlalchemy import select
+
+with engine.connect() as conn:
+    print(
+        export(
+            conn, select(user_table), CSVWriter("export_user_account.csv")
+        )
+    )
+
+### slide:: p
+# a join to Parquet.  The jump in peak memory here is mostly pyarrow
+# itself being imported, plus one row group's worth of batches.
+
+users_with_addresses = select(
+    user_table.c.id,
+    user_table.c.username,
+    user_table.c.created_at,
+    address_table.c.email_address,
+).join(address_table)
+
+with engine.connect() as conn:
+    print(
+        export(
+            conn,
+            users_with_addresses,
+            ParquetWriter(
+                "export_user_addresses.parquet", row_group_size=50000
+            ),
+        )
+    )
+
+### slide:: p
+# the file contains row groups of the size we asked for
+
+import pyarrow.parquet
+
+parquet_metadata = pyarrow.parquet.ParquetFile(
+    "export_user_addresses.parquet"
+).metadata
+parquet_metadata.num_rows, parquet_metadata.num_row_groups
+
+### slide:: p
+### title:: ORM statements
+# a Session exporting mapped objects.  Each User is written as its
+# column values, the same as the Core export of the table.
+
+from sqlalchemy.orm import Session, registry
+
+
+class User:
+    pass
+
+
+registry().map_imperatively(User, user_table)
+
+with Session(engine) as session:
+    print(
+        export(
+            session,
+            select(User).where(User.id <= 50000),
+            ParquetWriter("export_orm_users.parquet"),
+        )
+    )
+
+pyarrow.parquet.read_table("export_orm_users.parquet").slice(0, 3).to_pylist()
+
+### slide:: p
+### title:: Compared to buffering everything
+# the same export of the join to CSV, but calling .all() first.  Note
+# peak RSS after the streaming exports, then after this one.
+
+
+def export_buffered(executor, stmt, writer):
+    now = time.perf_counter()
+    result = executor.execute(stmt)
+    rows = result.all()
+    names, types, expand = layout(stmt, list(result.keys()))
+    writer.open(names, types)
+    writer.write(expand(rows))
+    writer.close()
+    elapsed = time.perf_counter() - now
+    return ExportStats(len(rows), round(len(rows) / elapsed), peak_rss_mb())
+
+
+with engine.connect() as conn:
+    print(
+        export(
+            conn, users_with_addresses, CSVWriter("export_user_addresses.csv")
+        )
+    )
+    print(
+        export_buffered(
+            conn, users_with_addresses, CSVWriter("export_user_addresses.csv")
+        )
+    )
+
+### slide::
+### title:: Questions?
+
+### slide::
@@ -1,3 +1,5 @@
+import atexit
+import functools
 import logging
 import os
 import sys
@@ -5,19 +7,254 @@ import sys
 from sliderepl import Deck
 
 
+class _LazyStream:
+    """Stream that creates the real stream on first write.
+
+    Highlighting pulls in Pygments' lexer and formatter modules; deferring
+    it until the first SQL statement is logged keeps it out of startup.
+
+    """
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._stream = None
+
+    def write(self, text):
+        if self._stream is None:
+            self._stream = self._factory()
+        self._stream.write(text)
+
+    def flush(self):
+        if self._stream is not None:
+            self._stream.flush()
+
+
+_booleans = {
+    "true": 1,
+    "yes": 1,
+    "on": 1,
+    "false": 0,
+    "no": 0,
+    "off": 0,
+}
+
+
+def _env_option(name, default):
+    """Integer option from a SADECK_<NAME> environment variable; yes/no,
+    true/false and on/off are accepted as 1 and 0."""
+    variable = "SADECK_%s" % name.upper()
+    value = os.environ.get(variable)
+    if value is None:
+        return default
+    value = value.strip().lower()
+    if value in _booleans:
+        return _booleans[value]
+    try:
+        return int(value)
+    except ValueError:
+        raise ValueError(
+            "%s must be an integer, or yes / no, not %r"
+            % (variable, os.environ[variable])
+        )
+
+
+def _is_parameters(record):
+    # the engine logs each statement on its own, then its parameters
+    # as a second record with format arguments.  The answer is kept on
+    # the record, as truncating or queueing it removes the arguments.
+    try:
+        return record.sql_parameters
+    except AttributeError:
+        record.sql_parameters = bool(record.args)
+        return record.sql_parameters
+
+
+class _SampleFilter(logging.Filter):
+    """Pass one in every ``sample`` statements, along with its parameters."""
+
+    def __init__(self, sample):
+        super().__init__()
+        self.sample = sample
+        self._count = 0
+        self._passing = True
+
+    def filter(self, record):
+        if not record.name.startswith("sqlalchemy.engine"):
+            return True
+        if not _is_parameters(record):
+            self._passing = self._count % self.sample == 0
+            self._count += 1
+        return self._passing
+
+
+class _TruncateFilter(logging.Filter):
+    """Cut parameter output down to ``max_length`` characters."""
+
+    def __init__(self, max_length):
+        super().__init__()
+        self.max_length = max_length
+
+    def filter(self, record):
+        if record.name.startswith("sqlalchemy.engine") and _is_parameters(
+            record
+        ):
+            message = record.getMessage()
+            if len(message) > self.max_length:
+                record.msg = "%s ... (%d characters truncated)" % (
+                    message[: self.max_length],
+                    len(message) - self.max_length,
+                )
+                record.args = None
+        return True
+
+
+class _HighlightingFormatter(logging.Formatter):
+    """Formatter that highlights SQL with Pygments.
+
+    The same statement text is logged over and over, e.g. a lazy load
+    per object in a loop, so rendered statements are kept in an LRU cache
+    keyed on the text.  Parameters are different nearly every time and
+    are highlighted without caching.
+
+    """
+
+    def __init__(self, prefix, max_size):
+        super().__init__()
+        self.prefix = prefix
+        self.max_size = max_size
+        self._highlight = None
+
+    def _setup(self):
+        from pygments import highlight
+        from pygments.formatters import TerminalFormatter
+        from pygments.lexers import SqlLexer
+
+        lexer, formatter = SqlLexer(), TerminalFormatter()
+
+        def render(text):
+            return highlight(text, lexer, formatter).rstrip("\n")
+
+        self._render = render
+        self._highlight = functools.lru_cache(self.max_size)(render)
+
+    def format(self, record):
+        if self._highlight is None:
+            self._setup()
+        message = record.getMessage()
+        if _is_parameters(record):
+            return self.prefix + self._render(message)
+        return self.prefix + self._highlight(message)
+
+    def cache_info(self):
+        return self._highlight and self._highlight.cache_info()
+
+
 class SADeck(Deck):
-    expose = Deck.expose + ("echo",)
+    expose = Deck.expose + ("echo", "importtime", "slowlog", "slowreport")
+
+    def __init__(
+        self,
+        path=None,
+        echo_on=True,
+        lazy=None,
+        echo_queue=None,
+        echo_sample=None,
+        echo_max_params=None,
+        echo_highlight_cache=None,
+        slow_threshold=None,
+        **options
+    ):
+        """Options not given are read from SADECK_<OPTION> environment
+        variables:
 
-    def __init__(self, path=None, echo_on=True, **options):
+        * lazy - set up SQL highlighting on first use; 1 or 0, default 1
+        * echo_queue - hand echo output to a background thread through a
+          queue of this size, dropping records when it's full; 0, the
+          default, writes it on the executing thread
+        * echo_sample - echo one in this many statements; default 1
+        * echo_max_params - truncate logged parameters to this many
+          characters; 0 for no limit, default 500
+        * echo_highlight_cache - number of highlighted statements to keep
+          for reuse; 0 to highlight with sliderepl's highlight_stdout()
+          instead, default 1000.  The cache is only used when stdout is
+          a terminal; otherwise highlight_stdout() decides, so that no
+          color codes end up in a pipe or file
+        * slow_threshold - milliseconds above which the slow query log
+          prints a statement; default 100
+
+        """
         Deck.__init__(self, path, **options)
         self.start_with_echo = echo_on
+        self.lazy = bool(_env_option("lazy", 1) if lazy is None else lazy)
+        self.echo_queue = (
+            _env_option("echo_queue", 0) if echo_queue is None else echo_queue
+        )
+        self.echo_sample = (
+            _env_option("echo_sample", 1)
+            if echo_sample is None
+            else echo_sample
+        )
+        self.echo_max_params = (
+            _env_option("echo_max_params", 500)
+            if echo_max_params is None
+            else echo_max_params
+        )
+        self.echo_highlight_cache = (
+            _env_option("echo_highlight_cache", 1000)
+            if echo_highlight_cache is None
+            else echo_highlight_cache
+        )
+        self.slow_threshold = (
+            _env_option("slow_threshold", 100)
+            if slow_threshold is None
+            else slow_threshold
+        )
+        self._echo_listener = None
+        self._slow_log = None
 
     def start(self):
-        logging_config = {
-            "format": "[SQL]: %(message)s",
-            "stream": self.highlight_stdout("sql"),
-        }
-        logging.basicConfig(**logging_config)
+        if self.echo_highlight_cache and sys.stdout.isatty():
+            # the formatter sets up Pygments on first use, unless we're
+            # not being lazy
+            formatter = _HighlightingFormatter(
+                "[SQL]: ", self.echo_highlight_cache
+            )
+            if not self.lazy:
+                formatter._setup()
+            handler = logging.StreamHandler(sys.stdout)
+            handler.setFormatter(formatter)
+        else:
+            if self.lazy:
+                stream = _LazyStream(lambda: self.highlight_stdout("sql"))
+            else:
+                stream = self.highlight_stdout("sql")
+            handler = logging.StreamHandler(stream)
+            handler.setFormatter(logging.Formatter("[SQL]: %(message)s"))
+
+        if self.echo_queue:
+            import queue
+
+            from _echoqueue import _DroppingQueueHandler, _QueueListener
+
+            # statements are only formatted on the executing thread;
+            # highlighting and writing happen on the listener's thread
+            self._echo_listener = _QueueListener(
+                queue.Queue(self.echo_queue), handler
+            )
+            self._echo_listener.start()
+            atexit.register(self._stop_echo_listener)
+            handler = _DroppingQueueHandler(self._echo_listener.queue)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+
+        # filters go on the first handler, so that records sampled out
+        # are never queued
+        if self.echo_sample > 1:
+            handler.addFilter(_SampleFilter(self.echo_sample))
+        if self.echo_max_params:
+            handler.addFilter(_TruncateFilter(self.echo_max_params))
+
+        logging.basicConfig(handlers=[handler])
+        self._echo_handler = handler
 
         sys.path.insert(0, os.path.dirname(self.path))
 
@@ -27,6 +264,42 @@ class SADeck(Deck):
         """Toggle SQL echo on or off."""
         self._set_echo(not self._echo)
 
+    def slowlog(self):
+        """Toggle the slow query log on or off."""
+        if self._slow_log is None:
+            from _slowlog import _SlowQueryLog
+
+            self._slow_log = _SlowQueryLog(self.slow_threshold)
+            self._slow_log.listen()
+            print(
+                "%% slow query log is now ON, threshold %s ms"
+                % self.slow_threshold
+            )
+        else:
+            self._slow_log.remove()
+            self._slow_log.report()
+            self._slow_log = None
+            print("% slow query log is now OFF")
+
+    def slowreport(self):
+        """Show statement timings collected by the slow query log."""
+        if self._slow_log is None:
+            print("% slow query log is OFF")
+        else:
+            self._slow_log.report()
+
+    def importtime(self):
+        """Show the slowest imports of this deck."""
+        import _importtime
+
+        _importtime.report(self.path)
+
+    def _stop_echo_listener(self):
+        self._echo_listener.stop()
+        dropped = self._echo_handler.dropped
+        if dropped:
+            print("%% %d SQL echo records were dropped" % dropped)
+
     def _set_echo(self, value):
         self._echo = value
         log = logging.getLogger("sqlalchemy.engine")
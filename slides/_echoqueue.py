@@ -0,0 +1,33 @@
+"""Background thread for SADeck's queued SQL echo output."""
+
+import logging.handlers
+import queue
+
+from _config import _is_parameters
+
+
+class _DroppingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler that drops records when the queue is full.
+
+    The thread executing statements never waits on the echo output;
+    records that don't fit are counted in ``dropped`` instead.
+
+    """
+
+    dropped = 0
+
+    def prepare(self, record):
+        _is_parameters(record)
+        return super().prepare(record)
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    def enqueue_sentinel(self):
+        # wait for room, so that stopping always drains the queue
+        self.queue.put(self._sentinel)
@@ -0,0 +1,97 @@
+"""Measure the cost of SQL echo per statement.
+
+Runs the same SELECT over and over, the way the N+1 lazy loads in
+04_orm_adv.py do, with echo off, echo without highlighting, and echo
+highlighted with and without SADeck's cache of rendered statements.
+Output goes to os.devnull, so only formatting and highlighting are
+measured::
+
+    .venv/bin/python _echotime.py --statements 5000
+
+"""
+
+import argparse
+import logging
+import os
+import time
+
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table
+from sqlalchemy import create_engine, select
+
+from _config import _HighlightingFormatter
+
+metadata = MetaData()
+
+user_table = Table(
+    "user_account",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("username", String(30)),
+)
+
+address_table = Table(
+    "address",
+    metadata,
+    Column("id", Integer, primary_key=True),
+    Column("user_id", ForeignKey("user_account.id")),
+    Column("email_address", String(100)),
+)
+
+
+def run(engine, num_statements):
+    stmt = select(address_table).where(address_table.c.user_id == 1)
+    with engine.connect() as conn:
+        now = time.perf_counter()
+        for _ in range(num_statements):
+            conn.execute(stmt).all()
+        return time.perf_counter() - now
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--statements", type=int, default=5000)
+    options = parser.parse_args(argv)
+
+    engine = create_engine("sqlite://", future=True)
+    with engine.begin() as conn:
+        metadata.create_all(conn)
+        conn.execute(user_table.insert(), {"id": 1, "username": "spongebob"})
+        conn.execute(
+            address_table.insert(),
+            {"user_id": 1, "email_address": "spongebob@gmail.com"},
+        )
+
+    log = logging.getLogger("sqlalchemy.engine")
+    log.propagate = False
+    devnull = open(os.devnull, "w")
+
+    baseline = None
+    for label, formatter in [
+        ("echo off", None),
+        ("echo, no highlighting", logging.Formatter("[SQL]: %(message)s")),
+        ("echo, highlighted", _HighlightingFormatter("[SQL]: ", 0)),
+        ("echo, highlight cache", _HighlightingFormatter("[SQL]: ", 1000)),
+    ]:
+        log.handlers[:] = []
+        if formatter is None:
+            log.setLevel(logging.WARN)
+        else:
+            handler = logging.StreamHandler(devnull)
+            handler.setFormatter(formatter)
+            log.addHandler(handler)
+            log.setLevel(logging.INFO)
+
+        # once to warm up the statement cache and Pygments
+        run(engine, 10)
+        elapsed = run(engine, options.statements)
+        per_statement = elapsed / options.statements * 1000000
+        if baseline is None:
+            baseline = per_statement
+        print(
+            f"{label:<24} {per_statement:8.1f} us/statement  "
+            f"echo overhead {per_statement - baseline:8.1f} us"
+        )
+
+
+if __name__ == "__main__":
+    main()
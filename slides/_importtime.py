@@ -0,0 +1,169 @@
+"""Report what slide decks spend their import time on.
+
+For each deck, the import statements it contains are run in a fresh
+interpreter under ``python -X importtime``; the packages it imports are
+listed with their cumulative cost, followed by the individual modules
+that take longest.  With --startup, the time from
+launching ``sliderepl`` to its first prompt is measured as well, with
+and without SADeck's lazy startup, and compared to a target::
+
+    .venv/bin/python _importtime.py 04_orm_basic.py 05_perf_keyset.py
+    .venv/bin/python _importtime.py --startup --target 0.5 [0-9]*.py
+
+"""
+
+import argparse
+import ast
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+TARGET = 0.5
+
+_importtime_line = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def deck_imports(path):
+    """Return the source of the module level imports in a deck."""
+    with open(path) as f:
+        tree = ast.parse(f.read(), path)
+    return "\n".join(
+        ast.unparse(node)
+        for node in tree.body
+        if isinstance(node, (ast.Import, ast.ImportFrom))
+    )
+
+
+def import_times(source, cwd=None):
+    """Run source under -X importtime.
+
+    Returns a list of (self_us, cumulative_us, depth, module) tuples in the
+    order the modules finished importing.
+
+    """
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", source],
+        cwd=cwd,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    times = []
+    for line in proc.stderr.splitlines():
+        match = _importtime_line.match(line)
+        if match:
+            self_us, cumulative_us, indent, module = match.groups()
+            times.append(
+                (int(self_us), int(cumulative_us), len(indent) // 2, module)
+            )
+    return times
+
+
+def _sliderepl():
+    return shutil.which(
+        "sliderepl", path=os.path.dirname(sys.executable)
+    ) or shutil.which("sliderepl")
+
+
+def startup_time(path, lazy=True, repeat=3):
+    """Seconds from launching sliderepl on a deck to its first prompt.
+
+    stdin is empty, so the runner exits as soon as it reads from it; the
+    best of several runs is returned.
+
+    """
+    command = _sliderepl()
+    if command is None:
+        return None
+    env = dict(os.environ, SADECK_LAZY="1" if lazy else "0")
+    best = None
+    for _ in range(repeat):
+        now = time.perf_counter()
+        subprocess.run(
+            [command, os.path.basename(path)],
+            cwd=os.path.dirname(os.path.abspath(path)),
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+            timeout=60,
+        )
+        elapsed = time.perf_counter() - now
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(path, top=10, startup=False, target=TARGET):
+    # modules the interpreter imports on its own, such as site, aren't
+    # the deck's doing
+    baseline = {module for _, _, _, module in import_times("pass")}
+    times = [
+        entry
+        for entry in import_times(
+            deck_imports(path), cwd=os.path.dirname(os.path.abspath(path))
+        )
+        if entry[3] not in baseline
+    ]
+    total = sum(self_us for self_us, _, _, _ in times)
+    print(f"{os.path.basename(path)}: {total / 1000:.1f} ms importing")
+
+    # the packages the deck imports, then the individual modules that
+    # cost the most on their own
+    direct = sorted(
+        (entry for entry in times if entry[2] == 0),
+        key=lambda entry: entry[1],
+        reverse=True,
+    )
+    for _, cumulative_us, _, module in direct[:top]:
+        print(f"    {cumulative_us / 1000:8.1f} ms  {module}")
+    print("  slowest modules:")
+    for self_us, _, _, module in sorted(times, reverse=True)[:top]:
+        print(f"    {self_us / 1000:8.1f} ms  {module}")
+
+    if startup:
+        for lazy in (False, True):
+            elapsed = startup_time(path, lazy=lazy)
+            if elapsed is None:
+                print("    sliderepl not found; can't measure startup")
+                break
+            print(
+                f"    first prompt, {'lazy' if lazy else 'eager'}: "
+                f"{elapsed:.3f} sec "
+                f"({'ok' if elapsed <= target else 'over'} "
+                f"target of {target} sec)"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("decks", nargs="+")
+    parser.add_argument(
+        "--top", type=int, default=10, help="packages to list per deck"
+    )
+    parser.add_argument(
+        "--startup",
+        action="store_true",
+        help="also measure time to first prompt",
+    )
+    parser.add_argument(
+        "--target",
+        type=float,
+        default=TARGET,
+        help="time to first prompt to aim for, in seconds",
+    )
+    options = parser.parse_args(argv)
+
+    for path in options.decks:
+        report(
+            path,
+            top=options.top,
+            startup=options.startup,
+            target=options.target,
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,172 @@
+"""The slow query log behind SADeck's slowlog and slowreport commands."""
+
+import functools
+import os
+import re
+import sysconfig
+import threading
+import time
+import traceback
+
+
+_literals = re.compile(
+    r"""'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b|%\(\w+\)s|:\w+|\?"""
+)
+_lists = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_postcompile = re.compile(r"\(?\[POSTCOMPILE_\w+\]\)?")
+_whitespace = re.compile(r"\s+")
+
+
+@functools.lru_cache(1000)
+def _fingerprint(statement):
+    """Normalize a statement so that executions differing only in their
+    parameters or literal values look the same."""
+    statement = _postcompile.sub("(?+)", statement)
+    statement = _literals.sub("?", statement)
+    statement = _lists.sub("(?+)", statement)
+    return _whitespace.sub(" ", statement).strip()
+
+
+def _user_stack():
+    """The current stack, leaving out SQLAlchemy, the standard library,
+    installed packages such as sliderepl, and this module."""
+    import sqlalchemy
+
+    paths = sysconfig.get_paths()
+    skip = tuple(
+        os.path.join(path, "")
+        for path in {
+            paths["stdlib"],
+            paths["purelib"],
+            paths["platlib"],
+            os.path.dirname(sqlalchemy.__file__),
+        }
+    )
+    return [
+        frame
+        for frame in traceback.extract_stack()[:-1]
+        if not frame.filename.startswith(skip)
+        and frame.filename != __file__
+    ]
+
+
+def _percentile(ordered, percent):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * percent / 100))]
+
+
+class _SlowQueryLog:
+    """Times every statement, prints the ones slower than ``threshold``
+    milliseconds or that raised, with the user code that ran them, and
+    keeps durations per statement fingerprint for report()."""
+
+    def __init__(self, threshold):
+        self.threshold = threshold
+        self.durations = {}
+        self.slow = {}
+        self.failed = {}
+        self._lock = threading.Lock()
+
+    def listen(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.listen(Engine, "before_cursor_execute", self._before)
+        event.listen(Engine, "after_cursor_execute", self._after)
+        event.listen(Engine, "handle_error", self._error)
+
+    def remove(self):
+        from sqlalchemy import event
+        from sqlalchemy.engine import Engine
+
+        event.remove(Engine, "before_cursor_execute", self._before)
+        event.remove(Engine, "after_cursor_execute", self._after)
+        event.remove(Engine, "handle_error", self._error)
+
+    def _before(self, conn, cursor, statement, parameters, context, many):
+        # the context goes along with the start time, so that _error
+        # only pops a start time that belongs to the failed statement
+        conn.info.setdefault("slow_query_start", []).append(
+            (context, time.perf_counter())
+        )
+
+    def _after(self, conn, cursor, statement, parameters, context, many):
+        _, start = conn.info["slow_query_start"].pop()
+        elapsed = (time.perf_counter() - start) * 1000
+        fingerprint = _fingerprint(statement)
+        with self._lock:
+            self.durations.setdefault(fingerprint, []).append(elapsed)
+        if elapsed < self.threshold:
+            return
+
+        stack = _user_stack()
+        with self._lock:
+            count, slowest, slowest_stack = self.slow.get(
+                fingerprint, (0, 0, None)
+            )
+            if elapsed >= slowest:
+                slowest, slowest_stack = elapsed, stack
+            self.slow[fingerprint] = (count + 1, slowest, slowest_stack)
+        print(
+            "%% slow query (%.1f ms): %s\n%s"
+            % (elapsed, fingerprint, "".join(traceback.format_list(stack)))
+        )
+
+    def _error(self, exception_context):
+        conn = exception_context.connection
+        starts = conn is not None and conn.info.get("slow_query_start")
+        if (
+            not starts
+            or starts[-1][0] is not exception_context.execution_context
+        ):
+            # raised before the statement reached the cursor
+            return
+        _, start = starts.pop()
+        elapsed = (time.perf_counter() - start) * 1000
+        fingerprint = _fingerprint(exception_context.statement)
+        stack = _user_stack()
+        with self._lock:
+            self.durations.setdefault(fingerprint, []).append(elapsed)
+            self.failed[fingerprint] = self.failed.get(fingerprint, 0) + 1
+        print(
+            "%% failed query (%.1f ms): %s\n%s"
+            % (elapsed, fingerprint, "".join(traceback.format_list(stack)))
+        )
+
+    def report(self, limit=20):
+        with self._lock:
+            durations = {
+                key: sorted(values) for key, values in self.durations.items()
+            }
+            slow = dict(self.slow)
+            failed = dict(self.failed)
+
+        print(
+            "%6s %6s %6s %9s %9s %9s %9s %10s  statement"
+            % (
+                "count",
+                "slow",
+                "failed",
+                "p50",
+                "p95",
+                "p99",
+                "max",
+                "total ms",
+            )
+        )
+        for fingerprint, values in sorted(
+            durations.items(), key=lambda item: sum(item[1]), reverse=True
+        )[:limit]:
+            print(
+                "%6d %6d %6d %9.2f %9.2f %9.2f %9.2f %10.1f  %s"
+                % (
+                    len(values),
+                    slow.get(fingerprint, (0,))[0],
+                    failed.get(fingerprint, 0),
+                    _percentile(values, 50),
+                    _percentile(values, 95),
+                    _percentile(values, 99),
+                    values[-1],
+                    sum(values),
+                    fingerprint[:100],
+                )
+            )